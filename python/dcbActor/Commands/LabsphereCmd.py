@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 
 
+import time
+
 import opscore.protocols.keys as keys
 import opscore.protocols.types as types
 from enuActor.utils import waitForTcpServer
@@ -22,6 +24,8 @@ class LabsphereCmd(object):
             (self.name, 'status', self.status),
             (self.name, '<attenuator>', self.moveAttenuator),
             (self.name, '@(halogen) @(on|off)', self.switchHalogen),
+            (self.name, 'calibrate [<calibStep>]', self.calibrate),
+            (self.name, '<fluxTarget>', self.reachFlux),
             ('arc', '[<on>] [<off>] [<attenuator>] [force]', self.switch),
             (self.name, 'stop', self.stop),
             (self.name, 'start [@(operation|simulation)]', self.start),
@@ -32,6 +36,8 @@ class LabsphereCmd(object):
         self.keys = keys.KeysDictionary("dcb_labsphere", (1, 1),
                                         keys.Key("channel", types.String(), help="which channel to power on"),
                                         keys.Key("attenuator", types.Int(), help="attenuator value"),
+                                        keys.Key("fluxTarget", types.Float(), help="flux to reach"),
+                                        keys.Key("calibStep", types.Int(), help="attenuator calibration step"),
                                         keys.Key("on", types.String() * (1, None),
                                                  help='which arc lamp to switch on.'),
                                         keys.Key("off", types.String() * (1, None),
@@ -70,42 +76,38 @@ class LabsphereCmd(object):
         self.controller.generate(cmd)
 
     @blocking
-    def switch(self, cmd):
+    def calibrate(self, cmd):
+        """Measure the attenuator transfer function for the current lamps."""
         cmdKeys = cmd.cmd.keywords
+        step = cmdKeys['calibStep'].values[0] if 'calibStep' in cmdKeys else None
 
-        arcOn = cmdKeys['on'].values if 'on' in cmdKeys else []
-        arcOff = cmdKeys['off'].values if 'off' in cmdKeys else []
-
-        force = True if 'force' in cmdKeys else False
-        attenuator = cmdKeys['attenuator'].values[0] if "attenuator" in cmdKeys else None
+        if step is not None and not 0 < step < 256:
+            raise ValueError('step must be between 1 and 255')
 
-        for arc in arcOn + arcOff:
-            if arc not in self.actor.arcs.keys():
-                raise KeyError('%s is unknown' % arc)
+        self.controller.substates.calibrate(cmd, step)
+        self.controller.generate(cmd)
 
-        switchOn = [(arc, 'on') for arc in arcOn if self.actor.arcs[arc] != 'on']
-        switchOff = [(arc, 'off') for arc in arcOff if self.actor.arcs[arc] != 'off']
+    @blocking
+    def reachFlux(self, cmd):
+        """Move the attenuator to the calibrated setting giving the requested flux."""
+        cmdKeys = cmd.cmd.keywords
 
-        if switchOn:
-            attenuator = self.controller.attenuator if attenuator is None else attenuator
-        else:
-            force = True
+        value = self.controller.fluxToAttenuator(cmd, target=cmdKeys['fluxTarget'].values[0])
+        if value != self.controller.attenuator:
+            self.controller.substates.move(cmd, value)
+        self.controller.generate(cmd)
 
-        if force:
-            attenuator = None if attenuator == self.controller.attenuator else attenuator
+    @blocking
+    def switch(self, cmd):
+        cmdKeys = cmd.cmd.keywords
 
-        effectiveSwitch = dict(switchOff + switchOn)
+        arcOn = cmdKeys['on'].values if 'on' in cmdKeys else []
+        arcOff = cmdKeys['off'].values if 'off' in cmdKeys else []
 
-        halogen = effectiveSwitch.pop('halogen', None)
-        atenOn = [arc for arc, state in effectiveSwitch.items() if state == 'on']
-        atenOff = [arc for arc, state in effectiveSwitch.items() if state == 'off']
+        force = True if 'force' in cmdKeys else False
+        attenuator = cmdKeys['attenuator'].values[0] if "attenuator" in cmdKeys else None
 
-        self.controller.arc(cmd=cmd,
-                            atenOn=atenOn,
-                            atenOff=atenOff,
-                            halogen=halogen,
-                            force=force,
-                            attenuator=attenuator)
+        self.controller.switchArcs(cmd, arcOn=arcOn, arcOff=arcOff, attenuator=attenuator, force=force)
 
         cmd.finish()
 
@@ -127,6 +129,7 @@ class LabsphereCmd(object):
         mode = 'operation' if 'operation' in cmdKeys else mode
         mode = 'simulation' if 'simulation' in cmdKeys else mode
 
+        start = time.time()
         cmd.inform('text="powering up labsphere controller ..."')
         self.actor.ownCall(cmd, cmdStr='power on=labsphere', failMsg='failed to power on labsphere controller')
 
@@ -136,5 +139,6 @@ class LabsphereCmd(object):
                              port=self.actor.config.get('labsphere', 'port'))
 
         self.actor.connect('labsphere', cmd=cmd, mode=mode)
+        cmd.inform('startupTime=labsphere,%.1f,OK' % (time.time() - start))
 
         self.controller.generate(cmd)
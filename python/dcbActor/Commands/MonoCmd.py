@@ -1,6 +1,10 @@
 #!/usr/bin/env python
 
 
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import opscore.protocols.keys as keys
 import opscore.protocols.types as types
 from enuActor.utils import waitForTcpServer
@@ -24,6 +28,8 @@ class MonoCmd(object):
             (self.name, '@(set) <grating>', self.setGrating),
             (self.name, '@(set) <outport>', self.setOutport),
             (self.name, '@(set) <wave>', self.setWave),
+            (self.name, 'scan <from> <to> <step> [<dwell>] [@(flux)] [@(vaw)]', self.scan),
+            (self.name, 'abort', self.abort),
             (self.name, 'stop', self.stop),
             (self.name, 'start [@(operation|simulation)]', self.start),
 
@@ -34,6 +40,10 @@ class MonoCmd(object):
                                         keys.Key("grating", types.Int(), help="Grating Id"),
                                         keys.Key("outport", types.Int(), help="Outport Id"),
                                         keys.Key("wave", types.Float(), help="Wavelength"),
+                                        keys.Key("from", types.Float(), help="Scan first wavelength"),
+                                        keys.Key("to", types.Float(), help="Scan last wavelength"),
+                                        keys.Key("step", types.Float(), help="Scan wavelength step"),
+                                        keys.Key("dwell", types.Float(), help="Time to wait at each point (secs)"),
                                         )
 
     @property
@@ -84,7 +94,7 @@ class MonoCmd(object):
         cmdKeys = cmd.cmd.keywords
         outportId = int(cmdKeys["outport"].values[0])
 
-        self.controller.setOutport(cmd=cmd, outportId=outportId)
+        self.controller.substates.setoutport(cmd, outportId)
         self.controller.generate(cmd)
 
     @blocking
@@ -94,9 +104,74 @@ class MonoCmd(object):
         cmdKeys = cmd.cmd.keywords
         wavelength = float(cmdKeys["wave"].values[0])
 
-        self.controller.setWave(cmd=cmd, wavelength=wavelength)
+        self.controller.substates.setwave(cmd, wavelength)
         self.controller.generate(cmd)
 
+    @blocking
+    def scan(self, cmd):
+        """Scan wavelength from/to with step, optionally sampling labsphere photodiode and monoqth power."""
+
+        cmdKeys = cmd.cmd.keywords
+        start = float(cmdKeys["from"].values[0])
+        end = float(cmdKeys["to"].values[0])
+        step = float(cmdKeys["step"].values[0])
+        dwell = float(cmdKeys["dwell"].values[0]) if "dwell" in cmdKeys else 0.
+        maxPoints = self.actor.config.getint('mono', 'scanMaxPoints', fallback=1000)
+
+        if start == end:
+            raise ValueError('from and to must differ')
+        if not step:
+            raise ValueError('step must be non-zero')
+        if np.sign(step) != np.sign(end - start):
+            raise ValueError('step must be %s to scan from %g to %g' % ('positive' if end > start else 'negative',
+                                                                       start, end))
+
+        nPoints = int(np.floor(round((end - start) / step, 6))) + 1
+        if nPoints > maxPoints:
+            raise ValueError('scan has %d points, at most %d are allowed' % (nPoints, maxPoints))
+
+        waves = start + step * np.arange(nPoints)
+
+        self.controller.substates.scan(cmd, waves, dwell, "flux" in cmdKeys, "vaw" in cmdKeys)
+        self.controller.generate(cmd)
+
+    @singleShot
+    def abort(self, cmd):
+        """Abort the motion in progress."""
+        self.controller.doAbort()
+        cmd.finish('text="mono motion aborted"')
+
+    def startConcurrently(self, cmd, startups):
+        """| Run controllers startup functions concurrently, generate startupTime=controller,seconds,OK|FAILED.
+
+        :param cmd: on going command
+        :param startups: dict of controller name, startup function.
+        :raise: the first startup exception, once all of them have returned.
+        """
+        start = time.time()
+        elapsed = dict()
+
+        def timed(name, startup):
+            try:
+                startup()
+            finally:
+                elapsed[name] = time.time() - start
+
+        executor = ThreadPoolExecutor(max_workers=len(startups))
+        futures = dict([(name, executor.submit(timed, name, startup)) for name, startup in startups.items()])
+        executor.shutdown(wait=True)
+
+        errors = []
+        for name, future in futures.items():
+            error = future.exception()
+            gen = cmd.inform if error is None else cmd.warn
+            gen('startupTime=%s,%.1f,%s' % (name, elapsed[name], 'OK' if error is None else 'FAILED'))
+            if error is not None:
+                errors.append(error)
+
+        if errors:
+            raise errors[0]
+
     @singleShot
     def stop(self, cmd):
         """ stop current motion, save hexapod position, power off hxp controller and disconnect"""
@@ -116,19 +191,25 @@ class MonoCmd(object):
         mode = 'operation' if 'operation' in cmdKeys else mode
         mode = 'simulation' if 'simulation' in cmdKeys else mode
 
-        cmd.inform('text="powering up mono controller ..."')
-        self.actor.ownCall(cmd, cmdStr='power on=mono', failMsg='failed to power on mono controller')
+        def startMono():
+            cmd.inform('text="powering up mono controller ..."')
+            self.actor.ownCall(cmd, cmdStr='power on=mono', failMsg='failed to power on mono controller')
+
+            if mode == 'operation':
+                cmd.inform('text="waiting for tcp server ..."')
+                waitForTcpServer(host=self.actor.config.get('mono', 'host'),
+                                 port=self.actor.config.get('mono', 'port'))
 
-        if mode == 'operation':
-            cmd.inform('text="waiting for tcp server ..."')
-            waitForTcpServer(host=self.actor.config.get('mono', 'host'),
-                             port=self.actor.config.get('mono', 'port'))
+            self.actor.connect('mono', cmd=cmd, mode=mode)
 
-        self.actor.connect('mono', cmd=cmd, mode=mode)
+            cmd.inform('text="mono init ..."')
+            self.actor.ownCall(cmd, cmdStr='mono init', failMsg='failed to init mono')
 
-        cmd.inform('text="mono init ..."')
-        self.actor.ownCall(cmd, cmdStr='mono init', failMsg='failed to init mono')
+        def startMonoqth():
+            # monoqth is not powered through the mono controller, it can be connected in the meantime.
+            # connections themselves are serialised by the actor, only power up and init overlap with it.
+            self.actor.connect('monoqth', cmd=cmd, mode=mode)
 
-        self.actor.connect('monoqth', cmd=cmd, mode=mode)
+        self.startConcurrently(cmd, dict(mono=startMono, monoqth=startMonoqth))
 
         self.controller.generate(cmd)
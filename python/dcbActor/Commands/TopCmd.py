@@ -1,10 +1,14 @@
 #!/usr/bin/env python
 
 
-import configparser
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 
 import opscore.protocols.keys as keys
 import opscore.protocols.types as types
+from opscore.utility.qstr import qstr
+from dcbActor.utils import sequence
+from enuActor.utils.wrap import singleShot
 
 
 class TopCmd(object):
@@ -21,7 +25,9 @@ class TopCmd(object):
             ('ping', '', self.ping),
             ('status', '[@all] [<controllers>]', self.status),
             ('monitor', '<controllers> <period>', self.monitor),
-            ('config', '<fibers>', self.configFibers)
+            ('config', '<fibers>', self.configFibers),
+            ('iostats', '[reset]', self.iostats),
+            ('sequence', '@(<steps>|<file>)', self.sequence),
         ]
 
         # Define typed command arguments for the above commands.
@@ -36,6 +42,10 @@ class TopCmd(object):
                                                  help='the period to sample at.'),
                                         keys.Key("fibers", types.String() * (1, None),
                                                  help='the names of current fiber bundles'),
+                                        keys.Key("steps", types.String(),
+                                                 help='sequence steps, separated by semicolons'),
+                                        keys.Key("file", types.String(),
+                                                 help='sequence file, one step per line'),
                                         )
 
     def monitor(self, cmd):
@@ -53,6 +63,9 @@ class TopCmd(object):
                 continue
 
             self.actor.monitor(c, period, cmd=cmd)
+            self.actor.scheduler.setPeriod(c, period)
+            if c in self.actor.controllers:
+                self.actor.controllers[c].monitor = 0
             foundOne = True
 
         if foundOne:
@@ -74,36 +87,120 @@ class TopCmd(object):
         cmd.warn("text='I am an empty and fake actor'")
         cmd.finish("text='Present and (probably) well'")
 
+    @singleShot
     def status(self, cmd):
         """Report camera status and actor version. """
         cmdKeys = cmd.cmd.keywords
         self.actor.sendVersionKey(cmd)
         cmd.inform('text=%s' % ("Present!"))
         cmd.inform('text="monitors: %s"' % (self.actor.monitors))
+        self.actor.scheduler.genKeys(cmd)
         cmd.inform('text="config id=0x%08x %r"' % (id(self.actor.config),
                                                    self.actor.config.sections()))
 
         self.actor.updateStates(cmd=cmd)
         self.actor.pfsDesignId(cmd=cmd)
 
-        if 'all' in cmdKeys:
-            for controller in self.actor.controllers:
-                self.actor.callCommand("%s status" % controller)
+        controllers = list(self.actor.controllers.keys()) if 'all' in cmdKeys else []
         if 'controllers' in cmdKeys:
-            for controller in cmdKeys['controllers'].values:
-                self.actor.callCommand("%s status" % controller)
+            controllers += [c for c in cmdKeys['controllers'].values if c not in controllers]
+
+        if controllers:
+            self.controllersStatus(cmd, controllers)
 
         cmd.finish(self.controllerKey())
 
+    def controllersStatus(self, cmd, controllers):
+        """| Call all controllers status concurrently, and wait for every one of them to reply or time out.
+        | Each controller generates statusLatency=controller,OK|FAILED|TIMEOUT,seconds.
+
+        :param cmd: on going command
+        :param controllers: list of controller names.
+        """
+        timeLim = self.actor.config.getint(self.actor.name, 'statusTimeout', fallback=30)
+        start = time.time()
+
+        def callStatus(controller):
+            cmdVar = self.actor.cmdr.call(actor=self.actor.name,
+                                          cmdStr='%s status' % controller,
+                                          forUserCmd=cmd,
+                                          timeLim=timeLim)
+            return 'FAILED' if cmdVar.didFail else 'OK', time.time() - start
+
+        executor = ThreadPoolExecutor(max_workers=len(controllers))
+        futures = dict([(controller, executor.submit(callStatus, controller)) for controller in controllers])
+        wait(futures.values(), timeout=timeLim + 5)
+        executor.shutdown(wait=False)
+
+        for controller, future in futures.items():
+            try:
+                ret, elapsed = future.result(timeout=0)
+            except Exception:
+                ret, elapsed = 'TIMEOUT', time.time() - start
+
+            gen = cmd.inform if ret == 'OK' else cmd.warn
+            gen('statusLatency=%s,%s,%.3f' % (controller, ret, elapsed))
+
+    def iostats(self, cmd):
+        """Report controllers I/O round trip statistics, optionally reset them."""
+        cmdKeys = cmd.cmd.keywords
+
+        for controller in self.actor.controllers.values():
+            iostats = getattr(controller, 'iostats', None)
+            if iostats is None:
+                continue
+
+            iostats.genKeys(cmd)
+            if 'reset' in cmdKeys:
+                iostats.reset()
+
+            publisher = getattr(controller, 'publisher', None)
+            if publisher is not None:
+                publisher.genKeys(cmd, controller.name)
+
+        cmd.finish()
+
+    @singleShot
+    def sequence(self, cmd):
+        """| Run a whole sequence of steps, validated up front, without intermediate status.
+        | sequenceStep=i,nSteps,step,elapsed,OK|FAILED is generated after each step.
+        | sequenceTiming=nDone,nSteps,total,step durations is generated at the end.
+        """
+        cmdKeys = cmd.cmd.keywords
+
+        if 'file' in cmdKeys:
+            with open(cmdKeys['file'].values[0]) as sequenceFile:
+                text = sequenceFile.read()
+        else:
+            text = cmdKeys['steps'].values[0]
+
+        steps = sequence.parse(text)
+        sequence.validate(self.actor, steps)
+
+        durations = []
+        start = time.time()
+        try:
+            for i, step in enumerate(steps):
+                stepStart = time.time()
+                status = 'FAILED'
+                try:
+                    step(self.actor, cmd)
+                    status = 'OK'
+                finally:
+                    durations.append(time.time() - stepStart)
+                    gen = cmd.inform if status == 'OK' else cmd.warn
+                    gen('sequenceStep=%d,%d,%s,%.1f,%s' % (i + 1, len(steps), qstr(step.text), durations[-1], status))
+        finally:
+            cmd.inform('sequenceTiming=%d,%d,%.1f,%s' % (len(durations), len(steps), time.time() - start,
+                                                         ','.join(['%.1f' % duration for duration in durations])))
+
+        cmd.finish()
+
     def configFibers(self, cmd):
         cmdKeys = cmd.cmd.keywords
         fibers = cmdKeys['fibers'].values
 
-        conf = configparser.ConfigParser()
-        conf.read_file(open('/software/ait/fiberConfig.cfg'))
-        strFibers = ','.join([fib.strip() for fib in fibers])
-        conf.set('current', 'fibers', strFibers)
-        conf.write(open('/software/ait/fiberConfig.cfg', 'w'))
+        self.actor.fiberConfig.write(fibers)
         self.actor.pfsDesignId(cmd=cmd)
 
         cmd.finish()
@@ -1,5 +1,6 @@
 __author__ = 'alefur'
 import logging
+import time
 
 from enuActor.Controllers import pdu as pdu
 from enuActor.Simulators.pdu import PduSim
@@ -15,6 +16,8 @@ class aten(pdu.pdu):
         pdu.pdu.__init__(self, actor, name, loglevel=loglevel)
         self.sim = PduSim()
         self.state = {}
+        self.pipelineFailures = 0
+        self.pipelineAfter = 0
 
     def _testComm(self, cmd):
         """| test communication
@@ -26,15 +29,84 @@ class aten(pdu.pdu):
         cmd.inform('atenVAW=%s,%s,%s' % self.measureVaw(cmd))
 
     def getStatus(self, cmd):
-        """| get all port status
+        """| get all port status and meters. Monitor ticks, generated on the broadcast command, only report outlets whose
+        | state changed, an explicit status reports all of them.
 
         :param cmd: on going command,
         :raise: Exception if the communication has failed with the controller
         """
-        for outlet in self.powerNames.keys():
-            self.portStatus(cmd, outlet=outlet)
+        start = time.time()
+        outlets = list(self.powerNames.keys())
+        cmdStrs = ['read status o%s simple' % outlet for outlet in outlets] + self.vawCommands()
+
+        replies = None
+
+        if time.time() > self.pipelineAfter:
+            try:
+                replies = self.checkReplies(outlets, self.pipeline(cmdStrs, cmd=cmd))
+                nRequests = 1
+                self.pipelineFailures = 0
+            except Exception as e:
+                # retry pipelining later, backing off up to an hour if it keeps failing.
+                backoff = min(60 * 2 ** self.pipelineFailures, 3600)
+                self.pipelineFailures += 1
+                self.pipelineAfter = time.time() + backoff
+                cmd.warn('text="pipelined status failed, one request per outlet for %ds: %s"' % (backoff, e))
+                self.closeSock()
+
+        if replies is None:
+            replies = self.checkReplies(outlets, [self.sendOneCommand(cmdStr, cmd=cmd) for cmdStr in cmdStrs])
+            nRequests = len(cmdStrs)
+
+        onChange = cmd is self.actor.bcast
+        for outlet, state in zip(outlets, replies):
+            self.setState(cmd, self.powerNames[outlet], state, onChange=onChange)
+
+        self.recordVaw(*replies[len(outlets):])
+        cmd.inform('atenVAW=%s,%s,%s' % tuple(replies[len(outlets):]))
+        cmd.inform('atenStatusLatency=%.3f,%d' % (time.time() - start, nRequests))
+        self.lastData = time.time()
+
+    def pipeline(self, cmdStrs, cmd):
+        """| write all commands at once then read all the replies in order.
+
+        :param cmdStrs: list of telnet commands.
+        :param cmd: on going command,
+        :return: list of replies.
+        :raise: Exception if the communication has failed with the controller
+        """
+        sock = self.connectSock()
+        sock.sendall(''.join(['%s%s' % (cmdStr, self.EOL) for cmdStr in cmdStrs]).encode('latin-1'))
 
-        cmd.inform('atenVAW=%s,%s,%s' % self.measureVaw(cmd))
+        return [self.pipelinedResponse(sock=sock, cmd=cmd) for cmdStr in cmdStrs]
+
+    def pipelinedResponse(self, sock, cmd):
+        """| read one pipelined reply, skipping the empty lines and the prompt the telnet server sends around it."""
+        reply = self.getOneResponse(sock=sock, cmd=cmd).lstrip('>').strip()
+        while not reply:
+            reply = self.getOneResponse(sock=sock, cmd=cmd).lstrip('>').strip()
+
+        return reply
+
+    def checkReplies(self, outlets, replies):
+        """| check that outlets replies are on/off and meters replies are numbers, so that shifted replies are never
+        | published as outlet states.
+
+        :param outlets: outlets, in the order of their replies.
+        :param replies: outlets replies followed by voltage, current and power.
+        :return: stripped replies.
+        :raise: ValueError if any reply is not what its command expects.
+        """
+        replies = [reply.strip() for reply in replies]
+
+        for outlet, state in zip(outlets, replies):
+            if state not in ['on', 'off']:
+                raise ValueError('unexpected outlet o%s status : %r' % (outlet, state))
+
+        for meter in replies[len(outlets):]:
+            float(meter)
+
+        return replies
 
     def portStatus(self, cmd, outlet):
         """| get state outlet
@@ -45,12 +117,16 @@ class aten(pdu.pdu):
         state = self.sendOneCommand('read status o%s simple' % outlet, cmd=cmd)
         self.setState(cmd, self.powerNames[outlet], state)
 
-    def setState(self, cmd, channel, state):
+    def setState(self, cmd, channel, state, onChange=False):
         """| set channel state
 
         :param cmd: on going command,
+        :param onChange: only generate keyword if the state has changed.
         :raise: Exception if the communication has failed with the controller
         """
+        if onChange and self.state.get(channel) == state:
+            return
+
         self.state[channel] = state
         cmd.inform('%s=%s' % (channel, state))
 
@@ -60,12 +136,24 @@ class aten(pdu.pdu):
         :param cmd: on going command,
         :raise: Exception if the communication has failed with the controller
         """
-        voltage = self.sendOneCommand('read meter dev volt simple', cmd=cmd)
-        current = self.sendOneCommand('read meter dev curr simple', cmd=cmd)
-        power = self.sendOneCommand('read meter dev pow simple', cmd=cmd)
+        voltage, current, power = [self.sendOneCommand(cmdStr, cmd=cmd) for cmdStr in self.vawCommands()]
+        self.recordVaw(voltage, current, power)
 
         return voltage, current, power
 
+    def recordVaw(self, voltage, current, power):
+        """| append total voltage, current and power to the telemetry store, real readings only.
+        """
+        if self.simulated:
+            return
+
+        self.actor.telemetry.recordMany([('aten.volts', voltage), ('aten.amps', current), ('aten.watts', power)])
+
+    def vawCommands(self):
+        """| total voltage, current and power commands.
+        """
+        return ['read meter dev %s simple' % meter for meter in ['volt', 'curr', 'pow']]
+
     def authenticate(self, pwd=None):
         """| log to the telnet server
 
@@ -1,41 +1,69 @@
 import logging
+import os
 import time
+from collections import deque
 
 import dcbActor.Controllers.labsphere_drivers as labsDrivers
 import enuActor.utils.bufferedSocket as bufferedSocket
 import numpy as np
+from dcbActor.Controllers.labsphere_sampler import PhotodiodeSampler
 from dcbActor.Simulators.labsphere import Labspheresim
+from dcbActor.utils import clock
+from dcbActor.utils.attenuatorCalibration import AttenuatorCalibration
+from dcbActor.utils.fluxStability import StabilityDetector
+from dcbActor.utils.iostats import IOStats
+from dcbActor.utils.planner import Planner
+from dcbActor.utils.publisher import Publisher
+from dcbActor.utils.settleHistory import SettleHistory
+from dcbActor.utils.warmupProfiles import WarmupProfiles
 from enuActor.utils.fsmThread import FSMThread
 
 
 class SmoothFlux(object):
-    def __init__(self):
+    """Fixed-capacity (timestamp, value) ring buffer of photodiode samples.
+
+    Statistics are updated once per sample, so reading median, std or last never rebuilds an array.
+    """
+
+    def __init__(self, capacity=9, minSamples=8, outdated=30):
         object.__init__(self)
-        self.current = []
+        self.capacity = capacity
+        self.minSamples = minSamples
+        self.outdated = outdated
+
+        self.timestamps = np.zeros(capacity)
+        self.samples = np.full(capacity, np.nan)
+        self.sorted = np.empty(capacity)
+        self.clear()
 
     @property
     def last(self):
-        return self.values[-1] if self.values.size else np.nan
+        return self._last
+
+    @property
+    def latest(self):
+        """Most recent (timestamp, value) sample, value can be nan."""
+        if not self.size:
+            return np.nan, np.nan
+
+        i = (self.head - 1) % self.capacity
+        return self.timestamps[i], self.samples[i]
 
     @property
-    def values(self):
-        values = np.array([val for time, val in self.current])
-        return values[~np.isnan(values)]
+    def nValid(self):
+        return self._nValid
 
     @property
     def median(self):
-        median = np.median(self.values) if self.isCompleted else np.nan
-        return median
+        return self._median if self.isCompleted else np.nan
 
     @property
     def mean(self):
-        mean = np.mean(self.values) if self.isCompleted else np.nan
-        return mean
+        return self._mean if self.isCompleted else np.nan
 
     @property
     def std(self):
-        std = np.std(self.values) if self.isCompleted else np.nan
-        return std
+        return self._std if self.isCompleted else np.nan
 
     @property
     def minStd(self):
@@ -45,19 +73,110 @@ class SmoothFlux(object):
 
     @property
     def isCompleted(self):
-        return len(self.values) >= 8
+        return self._nValid >= self.minSamples
 
-    def new(self, value):
+    def new(self, value, timestamp=None):
         """Max flux measured is 110 with Qth"""
         value = value if -0.005 < value < 130 else np.nan
-        self.current.append((time.time(), value))
-        self.smoothOut()
+        timestamp = time.time() if timestamp is None else timestamp
+
+        if self.size == self.capacity:
+            self._pop()
+
+        self.timestamps[self.head] = timestamp
+        self.samples[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        self.size += 1
+
+        if not np.isnan(value):
+            self._nValid += 1
+            self._sum += value
+            self._sumSq += value ** 2
+
+        self.smoothOut(outdated=self.outdated, now=timestamp)
 
-    def smoothOut(self, outdated=30):
-        self.current = self.current[-9:]
+    def smoothOut(self, outdated=30, now=None):
+        """| Drop samples older than outdated seconds and refresh statistics.
+
+        :param outdated: time window in seconds.
+        :param now: reference time, current time if None.
+        """
+        now = time.time() if now is None else now
+
+        while self.size and now - self.timestamps[self.tail] > outdated:
+            self._pop()
+
+        self._refresh()
+
+    def setPeriod(self, period, minOutdated=30):
+        """| Outdate samples after a full buffer polled every period seconds, so slow monitoring still fills it.
+
+        :param period: polling period in seconds.
+        :param minOutdated: shortest outdated window in seconds.
+        """
+        self.outdated = max(minOutdated, (self.capacity + 1) * period)
 
     def clear(self):
-        self.current.clear()
+        self.samples.fill(np.nan)
+        self.head = 0
+        self.size = 0
+        self._nValid = 0
+        self._sum = 0.
+        self._sumSq = 0.
+        self._median = np.nan
+        self._mean = np.nan
+        self._std = np.nan
+        self._last = np.nan
+
+    @property
+    def tail(self):
+        return (self.head - self.size) % self.capacity
+
+    def _pop(self):
+        """Remove the oldest sample from the buffer."""
+        value = self.samples[self.tail]
+        self.samples[self.tail] = np.nan
+        self.size -= 1
+
+        if not np.isnan(value):
+            self._nValid -= 1
+            self._sum -= value
+            self._sumSq -= value ** 2
+
+    def _refresh(self):
+        """Compute statistics once per sample, resync running sums to avoid drift.
+
+        Results are stored as plain attributes so that readers from another thread never see a half-updated buffer.
+        """
+        nValid = 0
+        last = np.nan
+
+        for i in range(self.size):
+            value = self.samples[(self.tail + i) % self.capacity]
+            if not np.isnan(value):
+                self.sorted[nValid] = value
+                nValid += 1
+                last = value
+
+        self._last = last
+        self._nValid = nValid
+
+        if not nValid:
+            self._sum = self._sumSq = 0.
+            self._median = self._mean = self._std = np.nan
+            return
+
+        valid = self.sorted[:nValid]
+        valid.sort()
+        half = nValid // 2
+        self._median = valid[half] if nValid % 2 else 0.5 * (valid[half - 1] + valid[half])
+
+        if self.head == 0:
+            self._sum = valid.sum()
+            self._sumSq = np.dot(valid, valid)
+
+        self._mean = self._sum / nValid
+        self._std = np.sqrt(max(self._sumSq / nValid - self._mean ** 2, 0))
 
 
 class labsphere(FSMThread, bufferedSocket.EthComm):
@@ -67,21 +186,28 @@ class labsphere(FSMThread, bufferedSocket.EthComm):
         :param actor: spsaitActor
         :param name: controller name
         """
-        substates = ['IDLE', 'MOVING', 'SWITCHING', 'WARMING', 'FAILED']
+        substates = ['IDLE', 'MOVING', 'SWITCHING', 'WARMING', 'CALIBRATING', 'FAILED']
         events = [{'name': 'move', 'src': 'IDLE', 'dst': 'MOVING'},
                   {'name': 'halogen', 'src': 'IDLE', 'dst': 'SWITCHING'},
                   {'name': 'warmup', 'src': 'IDLE', 'dst': 'WARMING'},
-                  {'name': 'idle', 'src': ['MOVING', 'SWITCHING', 'WARMING'], 'dst': 'IDLE'},
-                  {'name': 'fail', 'src': ['MOVING', 'SWITCHING', 'WARMING'], 'dst': 'FAILED'},
+                  {'name': 'calibrate', 'src': 'IDLE', 'dst': 'CALIBRATING'},
+                  {'name': 'idle', 'src': ['MOVING', 'SWITCHING', 'WARMING', 'CALIBRATING'], 'dst': 'IDLE'},
+                  {'name': 'fail', 'src': ['MOVING', 'SWITCHING', 'WARMING', 'CALIBRATING'], 'dst': 'FAILED'},
                   ]
         FSMThread.__init__(self, actor, name, events=events, substates=substates, doInit=True)
 
-        self.addStateCB('MOVING', self.moveAttenuator)
-        self.addStateCB('SWITCHING', self.switchHalogen)
-        self.addStateCB('WARMING', self.stabFlux)
-        self.sim = Labspheresim(self.actor)
+        self.publisher = Publisher()
+        self.addStateCB('MOVING', self.publisher.flushing(self.moveAttenuator))
+        self.addStateCB('SWITCHING', self.publisher.flushing(self.switchHalogen))
+        self.addStateCB('WARMING', self.publisher.flushing(self.stabFlux))
+        self.addStateCB('CALIBRATING', self.publisher.flushing(self.calibrate))
+        self.sim = None
 
         self.flux = SmoothFlux()
+        self.sampler = None
+        self.clock = clock.realClock
+        self.iostats = IOStats(self.name)
+        self.settleHistory = SettleHistory()
         self.attenuator = -1
         self.halogen = 'undef'
         self.monitor = 15
@@ -98,6 +224,18 @@ class labsphere(FSMThread, bufferedSocket.EthComm):
         else:
             raise ValueError('unknown mode')
 
+    @property
+    def sampling(self):
+        return self.sampler is not None and self.sampler.isActive
+
+    @property
+    def pollingPeriod(self):
+        """Photodiode polling period, from the sampler if active, from the monitor otherwise."""
+        if self.sampling:
+            return self.samplingPeriod
+
+        return self.actor.scheduler.period(self.name) or self.monitor
+
     def persistHalogen(self, cmd, state):
         self.halogen = state
         cmd.inform('halogen=%s' % state)
@@ -116,6 +254,22 @@ class labsphere(FSMThread, bufferedSocket.EthComm):
         """
 
         self.mode = self.actor.config.get('labsphere', 'mode') if mode is None else mode
+        self.clock = self.actor.clockFor(self.mode)
+        self.samplingPeriod = self.actor.config.getfloat('labsphere', 'samplingPeriod', fallback=0)
+        self.commandGap = self.actor.config.getfloat('labsphere', 'commandGap', fallback=0.05)
+        self.moveMode = self.actor.config.get('labsphere', 'moveMode', fallback='fixed')
+        self.settleTolerance = self.actor.config.getfloat('labsphere', 'settleTolerance', fallback=0.01)
+        # simulated moves settle on the simulator clock, they must not tighten real moves timeout.
+        self.settleHistory = SettleHistory(None if self.simulated else
+                                           os.path.join(self.actor.datadir, 'attenuatorSettle.json'))
+        self.warmupMode = self.actor.config.get('labsphere', 'warmupMode', fallback='predictive')
+        self.warmupTolerance = self.actor.config.getfloat('labsphere', 'warmupTolerance', fallback=0.01)
+        self.warmupTimeout = self.actor.config.getfloat('labsphere', 'warmupTimeout', fallback=300)
+        self.profiles = WarmupProfiles(os.path.join(self.actor.datadir, 'warmupProfiles.json'))
+        self.calibration = AttenuatorCalibration(os.path.join(self.actor.datadir, 'attenuatorCalibration.json'))
+        self.calibrationStep = self.actor.config.getint('labsphere', 'calibrationStep', fallback=8)
+        self.calibrationSamples = self.actor.config.getint('labsphere', 'calibrationSamples', fallback=3)
+        self.publisher.configure(self.actor.config)
         bufferedSocket.EthComm.__init__(self,
                                         host=self.actor.config.get('labsphere', 'host'),
                                         port=int(self.actor.config.get('labsphere', 'port')),
@@ -137,6 +291,7 @@ class labsphere(FSMThread, bufferedSocket.EthComm):
 
         :param cmd: on going command
         """
+        self.stopSampler()
         self.closeSock()
 
     def _testComm(self, cmd):
@@ -149,6 +304,25 @@ class labsphere(FSMThread, bufferedSocket.EthComm):
         self.checkPhotodiode(cmd, doRaise=True)
         self.persistHalogen(cmd=cmd, state='undef')
         self.persistAttenuator(cmd=cmd, value=-1)
+        self.startSampler(cmd)
+
+    def startSampler(self, cmd):
+        """| Start background photodiode sampling if samplingPeriod is set in the config file.
+
+        :param cmd: on going command
+        """
+        if self.sampling or not self.samplingPeriod > 0:
+            return
+
+        self.sampler = PhotodiodeSampler(self, period=self.samplingPeriod)
+        self.sampler.start()
+        cmd.inform('text="photodiode sampled every %.1fs"' % self.samplingPeriod)
+
+    def stopSampler(self):
+        """| Stop background photodiode sampling."""
+        if self.sampler is not None:
+            self.sampler.stop()
+            self.sampler = None
 
     def _init(self, cmd):
         """| Initialise the interlock board, called y device.initDevice().
@@ -157,47 +331,207 @@ class labsphere(FSMThread, bufferedSocket.EthComm):
         :param cmd: on going command
         :raise: Exception if a command fail, user if warned with error
         """
-        for cmdStr in labsDrivers.init():
-            self.sendOneCommand(cmdStr, cmd=cmd)
-
-        for cmdStr in labsDrivers.fullClose():
-            self.sendOneCommand(cmdStr, cmd=cmd)
-
-        self.sendOneCommand(labsDrivers.turnQth(state='off'), cmd=cmd)
+        self.transaction(labsDrivers.init() + labsDrivers.fullClose() + [labsDrivers.turnQth(state='off')], cmd=cmd)
 
         self.persistHalogen(cmd=cmd, state='off')
         self.persistAttenuator(cmd=cmd, value=255)
 
     def getStatus(self, cmd):
+        self.publisher.flush(cmd)
         self.checkPhotodiode(cmd=cmd)
+        self.genProfileKey(cmd)
+        self.genSettleKey(cmd)
+
+    def genProfileKey(self, cmd):
+        """| Generate warmupProfile=combination,timeToStable,plateau,noise,tau,nWarmups for the current lamps."""
+        combination = self.actor.lampCombination
+        profile = self.profiles.get(combination)
+        profile = dict() if profile is None else profile
+
+        cmd.inform('warmupProfile=%s,%.1f,%.3f,%.4f,%.1f,%d' % (combination, profile.get('timeToStable', np.nan),
+                                                                profile.get('plateau', np.nan),
+                                                                profile.get('noise', np.nan),
+                                                                profile.get('tau', np.nan),
+                                                                profile.get('nWarmups', 0)))
+
+    def genSettleKey(self, cmd):
+        """| Generate attenuatorSettleTimeout=scale,nMoves, converge mode timeout relative to the fixed move time."""
+        scale, nMoves = self.settleHistory.timeoutScale()
+        cmd.inform('attenuatorSettleTimeout=%.2f,%d' % (scale, nMoves))
 
     def moveAttenuator(self, cmd, value):
         tempo = 3 + abs(value - self.attenuator) * 9 / 255
 
-        for cmdStr in labsDrivers.attenuator(value):
-            self.sendOneCommand(cmdStr, cmd=cmd)
+        if self.moveMode == 'converge':
+            self.checkPhotodiode(cmd=cmd)
+            startFlux = self.flux.last
+
+        self.transaction(labsDrivers.attenuator(value), cmd=cmd)
+
+        if self.moveMode == 'converge':
+            self.waitFluxSettled(cmd, current=self.attenuator, target=value, startFlux=startFlux, fixedTime=tempo)
+        else:
+            self.waitFixed(cmd, tempo=tempo)
+
+        self.persistAttenuator(cmd=cmd, value=value)
+
+    def calibrate(self, cmd, step=None, nSamples=None):
+        """| Sweep the attenuator range and record the mean photodiode flux at each setting for the current lamps.
+        | The sweep starts from the end closest to the current setting and only moves one way, so that the total move
+        | time is minimal. Points are interpolated over the 256 settings and persisted as a lookup table. The attenuator
+        | is moved back to its initial setting afterwards, even if the sweep failed.
+        | attenuatorCalibPoint=setting,flux is generated for each point.
 
-        tlim = time.time() + tempo
+        :param cmd: on going command
+        :param step: attenuator step between two points.
+        :param nSamples: photodiode readings averaged at each point.
+        """
+        step = self.calibrationStep if step is None else step
+        nSamples = self.calibrationSamples if nSamples is None else nSamples
+        combination = self.actor.lampCombination
+        if combination == 'unknown':
+            raise RuntimeError('lamps state is unknown, cannot calibrate attenuator.')
+
+        settings = list(range(0, 255, step)) + [255]
+        if self.attenuator > 127:
+            settings = settings[::-1]
+
+        previous = self.attenuator
+        fluxes = []
+        start = self.clock.time()
+        try:
+            for setting in settings:
+                if self.exitASAP:
+                    raise SystemExit()
+
+                if setting != self.attenuator:
+                    self.moveAttenuator(cmd, setting)
+
+                fluxes.append(np.mean([self.photodiode(cmd=cmd) for i in range(nSamples)]))
+                cmd.inform('attenuatorCalibPoint=%d,%.4f' % (setting, fluxes[-1]))
+        finally:
+            # completed or not, the sweep must not leave the flux at its last setting.
+            if previous in range(256) and self.attenuator != previous:
+                self.moveAttenuator(cmd, previous)
+
+        table = self.calibration.update(combination, settings, fluxes)
+        cmd.inform('attenuatorCalib=%s,%d,%.4f,%.1f' % (combination, table['nPoints'], table['reference'],
+                                                        self.clock.time() - start))
+
+    def fluxToAttenuator(self, cmd, target):
+        """| Attenuator setting giving the closest flux to target with the current lamps, from their calibration scaled
+        | to the current flux.
+        | fluxTarget=target,setting,expected is generated.
 
-        while time.time() < tlim:
+        :param cmd: on going command
+        :param target: requested flux.
+        :return: attenuator setting.
+        """
+        self.checkPhotodiode(cmd=cmd, doRaise=True)
+        setting, expected = self.calibration.settingFor(self.actor.lampCombination, target,
+                                                        currentSetting=self.attenuator, currentFlux=self.flux.last)
+        cmd.inform('fluxTarget=%.3f,%d,%.3f' % (target, setting, expected))
+        return setting
+
+    def waitFixed(self, cmd, tempo):
+        """| Wait for tempo seconds, monitoring photodiode every 2 seconds.
+
+        :param cmd: on going command
+        :param tempo: time to wait in seconds.
+        """
+        tlim = self.clock.time() + tempo
+
+        while self.clock.time() < tlim:
             self.checkPhotodiode(cmd=cmd)
-            remainingTime = tlim - time.time()
+            remainingTime = tlim - self.clock.time()
 
             if remainingTime > 0:
                 sleepTime = 2 if remainingTime > 2 else remainingTime
-                time.sleep(sleepTime)
+                self.clock.sleep(sleepTime)
 
-        self.persistAttenuator(cmd=cmd, value=value)
+    def waitFluxSettled(self, cmd, current, target, startFlux, fixedTime, nSettled=3, minDelay=3.0, period=0.5):
+        """| Wait until photodiode flux settles at its new level, timeout is the fixed attenuator move time tightened by
+        | the settle times measured so far.
+        | Flux is considered settled when the last nSettled readings agree within settleTolerance, and the flux has
+        | left its starting level, or minDelay, the fixed move time base term, has elapsed and the calibration of the
+        | current lamps expects no flux change beyond tolerance.
+        | If no light reaches the photodiode, the move cannot be observed and the whole timeout is waited for.
+
+        :param cmd: on going command
+        :param current: attenuator value before the move.
+        :param target: attenuator value requested.
+        :param startFlux: flux before the move.
+        :param fixedTime: fixed attenuator move time in seconds.
+        """
+        delta = abs(target - current)
+        timeout = max(fixedTime * self.settleHistory.timeoutScale()[0], minDelay)
+        expectedChange = self.expectedFluxChange(current, target, startFlux)
+        start = self.clock.time()
+        readings = deque(maxlen=nSettled)
+        lastTime = np.nan
+        status = 'timeout'
+
+        if not startFlux > 0.01:
+            self.waitFixed(cmd, tempo=fixedTime)
+            status = 'dark'
+
+        while status == 'timeout' and self.clock.time() - start < timeout:
+            self.checkPhotodiode(cmd=cmd)
+            timestamp, flux = self.flux.latest
+
+            if timestamp != lastTime and not np.isnan(flux):
+                lastTime = timestamp
+                readings.append(flux)
+
+            if len(readings) == nSettled:
+                tolerance = max(self.settleTolerance * np.mean(readings), 0.002)
+                hasMoved = abs(readings[0] - startFlux) > tolerance
+                isSettled = max(readings) - min(readings) < tolerance
+                mustMove = not expectedChange < tolerance
+
+                if isSettled and (hasMoved or (not mustMove and self.clock.time() - start > minDelay)):
+                    status = 'settled'
+                    break
+
+            if self.exitASAP:
+                raise SystemExit()
+
+            self.clock.sleep(max(min(period, timeout - (self.clock.time() - start)), 0))
+
+        elapsed = self.clock.time() - start
+        self.settleHistory.add(delta, elapsed, fixedTime, status)
+        cmd.inform('attenuatorSettle=%d,%.2f,%.2f,%s' % (delta, elapsed, timeout, status))
+
+        if status == 'timeout':
+            cmd.warn('text="attenuator flux did not settle within %.1fs moving to %d"' % (timeout, target))
+
+    def expectedFluxChange(self, current, target, startFlux):
+        """| Flux change expected from the attenuator calibration of the current lamps, nan if unknown.
+
+        :param current: attenuator value before the move.
+        :param target: attenuator value requested.
+        :param startFlux: flux before the move.
+        """
+        if target == current:
+            return 0.
+
+        table = self.calibration.get(self.actor.lampCombination)
+        if table is None or current not in range(256) or not table['lut'][current] > 0:
+            return np.nan
+
+        return abs(table['lut'][target] - table['lut'][current]) * startFlux / table['lut'][current]
 
     def switchHalogen(self, cmd, state):
 
-        self.sendOneCommand(labsDrivers.turnQth(state=state), cmd=cmd)
+        self.transaction([labsDrivers.turnQth(state=state)], cmd=cmd)
         self.persistHalogen(cmd=cmd, state=state)
 
     def checkPhotodiode(self, cmd, doRaise=False):
         flux = np.nan
+        sampling = self.sampling
+        self.flux.setPeriod(self.pollingPeriod)
         try:
-            flux = self.photodiode(cmd=cmd)
+            flux = self.cachedPhotodiode() if sampling else self.photodiode(cmd=cmd)
 
         except Exception as e:
             if doRaise:
@@ -205,59 +539,325 @@ class labsphere(FSMThread, bufferedSocket.EthComm):
             else:
                 cmd.warn('text=%s' % self.actor.strTraceback(e))
         finally:
-            self.flux.new(flux)
-            cmd.inform('flux=%.3f,%.3f' % (self.flux.median, self.flux.std))
-            cmd.inform('photodiode=%.3f' % self.flux.last)
+            if not sampling:
+                self.flux.new(flux, timestamp=self.clock.time())
+            self.publisher.inform(cmd, 'flux', '%.3f,%.3f', self.flux.median, self.flux.std)
+            self.publisher.inform(cmd, 'photodiode', '%.3f', self.flux.last)
+            self.lastData = time.time()
+
+    def switchArcs(self, cmd, arcOn, arcOff, attenuator=None, force=False):
+        """| Switch only the lamps which are not already in the requested state, then call arc().
+
+        :param cmd: on going command
+        :param arcOn: lamps to switch on, halogen included.
+        :param arcOff: lamps to switch off, halogen included.
+        :param attenuator: final attenuator value, None to leave unchanged.
+        :param force: do not warmup.
+        :raise: KeyError if a lamp is unknown.
+        """
+        arcs = self.actor.arcs
+        for arc in list(arcOn) + list(arcOff):
+            if arc not in arcs.keys():
+                raise KeyError('%s is unknown' % arc)
+
+        switchOn = [(arc, 'on') for arc in arcOn if arcs[arc] != 'on']
+        switchOff = [(arc, 'off') for arc in arcOff if arcs[arc] != 'off']
+
+        if switchOn:
+            attenuator = self.attenuator if attenuator is None else attenuator
+        else:
+            force = True
+
+        if force:
+            attenuator = None if attenuator == self.attenuator else attenuator
+
+        effectiveSwitch = dict(switchOff + switchOn)
+
+        halogen = effectiveSwitch.pop('halogen', None)
+        atenOn = [arc for arc, state in effectiveSwitch.items() if state == 'on']
+        atenOff = [arc for arc, state in effectiveSwitch.items() if state == 'off']
+
+        self.arc(cmd=cmd, atenOn=atenOn, atenOff=atenOff, halogen=halogen, force=force, attenuator=attenuator)
 
     def arc(self, cmd, atenOn, atenOff, halogen, force, attenuator):
-        try:
-            if halogen is not None:
-                self.substates.halogen(cmd, halogen)
+        """| Switch lamps, warm them up and move the attenuator.
+        | Halogen relay and attenuator wheel share the labsphere line and are driven one after the other, while aten
+        | switches the arc lamps concurrently. Steps which are already satisfied are skipped.
 
-            powerOn = 'on=%s' % ','.join(atenOn) if atenOn else ''
-            powerOff = 'off=%s' % ','.join(atenOff) if atenOff else ''
+        :param cmd: on going command
+        :param atenOn: arc lamps to switch on.
+        :param atenOff: arc lamps to switch off.
+        :param halogen: on|off, None to leave unchanged.
+        :param force: do not warmup.
+        :param attenuator: final attenuator value, None to leave unchanged.
+        """
+        planner = Planner(clock=self.clock)
+        try:
+            if halogen is not None and halogen != self.halogen:
+                planner.add('halogen', self.substates.halogen, cmd, halogen, resource='labsphere', estimate=0.5)
 
-            if powerOn or powerOff:
-                cmdVar = self.actor.cmdr.call(actor=self.actor.name,
-                                              cmdStr='power %s %s' % (powerOn, powerOff),
-                                              forUserCmd=cmd,
-                                              timeLim=60)
+            if atenOn or atenOff:
+                planner.add('power', self.powerArcs, cmd, atenOn, atenOff, estimate=5)
 
             if not force:
-                self.substates.move(cmd, 0)
-                self.substates.warmup(cmd)
+                if self.attenuator != 0:
+                    planner.add('move0', self.substates.move, cmd, 0, resource='labsphere',
+                                estimate=3 + abs(self.attenuator) * 9 / 255)
+
+                planner.add('warmup', self.substates.warmup, cmd,
+                            requires=['power'] if 'power' in planner.steps else [], resource='labsphere', estimate=30)
+
+            path, estimate = planner.criticalPath(planned=True)
+            cmd.inform('arcPlan="%s",%.1f' % ('>'.join(path), estimate))
+            planner.run()
 
         finally:
-            if attenuator is not None:
+            if attenuator is not None and attenuator != self.attenuator:
+                start = self.clock.time()
                 self.substates.move(cmd, attenuator)
+                cmd.inform('text="final move in %.1fs"' % (self.clock.time() - start))
+
+            if planner:
+                path, elapsed = planner.criticalPath(planned=False)
+                cmd.inform('arcPath="%s",%.1f' % ('>'.join(path), elapsed))
+                cmd.inform('arcSteps=%s' % ','.join(['%s:%s' % (step.name, 'skipped' if step.skipped else
+                                                                '%.1f' % step.duration)
+                                                     for step in planner.steps.values()]))
+
+    def powerArcs(self, cmd, atenOn, atenOff):
+        """| Switch arc lamps through aten.
+
+        :param cmd: on going command
+        :param atenOn: arc lamps to switch on.
+        :param atenOff: arc lamps to switch off.
+        """
+        powerOn = 'on=%s' % ','.join(atenOn) if atenOn else ''
+        powerOff = 'off=%s' % ','.join(atenOff) if atenOff else ''
+
+        self.actor.cmdr.call(actor=self.actor.name,
+                             cmdStr='power %s %s' % (powerOn, powerOff),
+                             forUserCmd=cmd,
+                             timeLim=60)
 
     def stabFlux(self, cmd):
-        start = time.time()
-        self.flux.clear()
+        if self.warmupMode == 'legacy':
+            return self.legacyStabFlux(cmd)
+
+        start = self.clock.time()
+        self.clearFlux()
+        combination = self.actor.lampCombination
+        detector = self.warmupDetector(cmd, combination)
+
+        try:
+            while True:
+                self.checkPhotodiode(cmd=cmd)
+                detector.new(*self.flux.latest)
+
+                if detector.isStable:
+                    break
+
+                if (self.clock.time() - start) > self.warmupTimeout:
+                    cmd.inform('warmup=timeout,%.1f,0.0' % (self.clock.time() - start))
+                    # the warmup curve is still worth learning, its decay time tunes the next warmup.
+                    self.learnWarmup(cmd, combination, detector, timeToStable=np.nan)
+                    raise UserWarning('Photodiode flux is null or unstable')
+
+                if self.exitASAP:
+                    raise SystemExit()
+
+                self.clock.sleep(detector.nextPeriod)
+        finally:
+            # simulated warmups are instantly flat, they must not train the profiles used by real ones.
+            if not self.simulated:
+                self.saveWarmup(cmd, combination, detector)
+
+        elapsed = self.clock.time() - start
+        cmd.inform('text="flux stable at %.3f, predicted drift %.2f%%, decay time %.1fs"' % (detector.level,
+                                                                                           detector.drift * 100,
+                                                                                           detector.tau))
+        decision = 'predicted' if detector.isPredicted else 'legacy'
+        cmd.inform('warmup=%s,%.1f,%.1f' % (decision, elapsed, detector.timeSaved(elapsed)))
+        self.learnWarmup(cmd, combination, detector, timeToStable=elapsed)
+
+    def learnWarmup(self, cmd, combination, detector, timeToStable):
+        """| Blend a real warmup into the profile of its lamp combination, timed out ones only teach their decay time.
+
+        :param cmd: on going command
+        :param combination: lamp combination.
+        :param detector: warmup stability detector.
+        :param timeToStable: warmup duration in seconds, nan if it timed out.
+        """
+        if self.simulated or combination == 'unknown':
+            return
+
+        isStable = not np.isnan(timeToStable)
+        self.profiles.update(combination, timeToStable=timeToStable,
+                             plateau=detector.level if isStable else np.nan,
+                             noise=detector.noise if isStable else np.nan,
+                             tau=detector.fitDecayTime())
+        self.genProfileKey(cmd)
+
+    def warmupDetector(self, cmd, combination):
+        """| Create a stability detector, tuned with the learned profile of this lamp combination if any.
+
+        :param cmd: on going command
+        :param combination: lamp combination.
+        """
+        detector = StabilityDetector(tolerance=self.warmupTolerance)
+        profile = self.profiles.get(combination)
+
+        if profile is not None:
+            detector.tune(profile)
+            cmd.inform('text="%s expected stable in %.1fs, decay time %.1fs"' % (combination,
+                                                                                 profile.get('timeToStable', np.nan),
+                                                                                 profile.get('tau', np.nan)))
+
+        return detector
+
+    def saveWarmup(self, cmd, combination, detector):
+        """| Save warmup photodiode time series, never failing the warmup itself."""
+        try:
+            self.profiles.saveSeries(combination, detector.timestamps, detector.values)
+        except Exception as e:
+            cmd.warn('text="failed to save warmup series: %s"' % e)
+
+    def legacyStabFlux(self, cmd):
+        start = self.clock.time()
+        self.clearFlux()
 
         while not self.flux.isCompleted or not (self.flux.median > 0.01 and self.flux.std < self.flux.minStd):
 
             self.checkPhotodiode(cmd=cmd)
-            time.sleep(3)
+            self.clock.sleep(3)
 
-            if (time.time() - start) > 300:
+            if (self.clock.time() - start) > self.warmupTimeout:
+                cmd.inform('warmup=timeout,%.1f,0.0' % (self.clock.time() - start))
                 raise UserWarning('Photodiode flux is null or unstable')
 
             if self.exitASAP:
                 raise SystemExit()
 
+        cmd.inform('warmup=legacy,%.1f,0.0' % (self.clock.time() - start))
+
+    def clearFlux(self):
+        """| Clear flux buffer, in the sampler thread if it is publishing into it."""
+        if self.sampling:
+            self.sampler.execute(self.flux.clear)
+        else:
+            self.flux.clear()
+
+    def cachedPhotodiode(self):
+        """| Return the latest sampled photodiode value.
+
+        :raise: RuntimeError if the sampler has not published any value recently.
+        """
+        if self.sampler.age > 3 * self.samplingPeriod + 1:
+            raise RuntimeError('no photodiode value sampled in the last %.1fs' % self.sampler.age)
+
+        timestamp, flux = self.sampler.latest
+        return flux
+
     def photodiode(self, cmd, niter=0):
         try:
             footLamberts = self.sendOneCommand(labsDrivers.photodiode(), cmd=cmd)
-            return np.round(float(footLamberts) * 3.42626, 3)
+            flux = np.round(float(footLamberts) * 3.42626, 3)
+            # simulated readings would be indistinguishable from real ones afterwards.
+            if not self.simulated:
+                self.actor.telemetry.record('labsphere.photodiode', flux)
+            return flux
         except ValueError:
             if niter > 5:
                 raise
-            time.sleep(1)
+            self.iostats.retry(labsDrivers.photodiode()[:2])
+            self.clock.sleep(1)
             return self.photodiode(cmd=cmd, niter=niter + 1)
 
+    def sendOneCommand(self, cmdStr, doClose=False, cmd=None):
+        """| Send one command, queued through the photodiode sampler if it owns the socket."""
+        if self.sampling:
+            return self.sampler.execute(self._sendOneCommand, cmdStr, doClose=doClose, cmd=cmd)
+
+        return self._sendOneCommand(cmdStr, doClose=doClose, cmd=cmd)
+
+    def _sendOneCommand(self, cmdStr, doClose=False, cmd=None):
+        """| Send one command and record its I/O statistics, keyed by the two first characters."""
+        return self.iostats.call(cmdStr[:2], cmdStr, bufferedSocket.EthComm.sendOneCommand, self, cmdStr,
+                                 doClose=doClose, cmd=cmd)
+
+    def transaction(self, cmdStrs, cmd=None, doRaise=True):
+        """| Send a sequence of commands in a single transaction, queued through the sampler if it owns the socket.
+
+        :param cmdStrs: list of driver command strings.
+        :param cmd: on going command
+        :param doRaise: raise if any command failed.
+        :return: list of replies, None for failed commands.
+        :raise: RuntimeError if any command failed and doRaise.
+        """
+        if self.sampling:
+            return self.sampler.execute(self._transaction, cmdStrs, cmd=cmd, doRaise=doRaise)
+
+        return self._transaction(cmdStrs, cmd=cmd, doRaise=doRaise)
+
+    def _transaction(self, cmdStrs, cmd=None, doRaise=True):
+        """| Validate all commands, write them commandGap apart, then collect all replies in one read loop.
+        | After a failed read, the following commands are failed too and the socket is closed.
+
+        :param cmdStrs: list of driver command strings.
+        :param cmd: on going command
+        :param doRaise: raise if any command failed.
+        :return: list of replies, None for failed commands.
+        :raise: RuntimeError if any command failed and doRaise.
+        """
+        cmd = self.actor.bcast if cmd is None else cmd
+        cmdStrs = [labsDrivers.validate(cmdStr) for cmdStr in cmdStrs]
+        start = time.perf_counter()
+
+        sock = self.connectSock()
+        try:
+            for i, cmdStr in enumerate(cmdStrs):
+                if i:
+                    time.sleep(self.commandGap)
+                self.logger.debug('sending %r', cmdStr)
+                sock.sendall(('%s%s' % (cmdStr, self.EOL)).encode('latin-1'))
+        except Exception:
+            self.closeSock()
+            raise
+
+        replies = []
+        failures = []
+        for cmdStr in cmdStrs:
+            if failures:
+                # replies are not tagged, once one is missing the following ones cannot be matched anymore.
+                reply = None
+                failures.append(cmdStr)
+            else:
+                try:
+                    reply = self.ioBuffer.getOneResponse(sock=sock, cmd=cmd).strip()
+                    self.logger.debug('received %r', reply)
+                except Exception as e:
+                    reply = None
+                    failures.append(cmdStr)
+                    cmd.warn('text="%s failed : %s"' % (cmdStr, e))
+
+            replies.append(reply)
+
+        if failures:
+            # a late reply would otherwise be read as the reply of the next command.
+            self.closeSock()
+
+        self.iostats.record('batch', time.perf_counter() - start, bytesOut=sum([len(cmdStr) for cmdStr in cmdStrs]),
+                            bytesIn=sum([len(reply) for reply in replies if reply]), failed=bool(failures))
+
+        if failures and doRaise:
+            raise RuntimeError('%d/%d labsphere commands failed : %s' % (len(failures), len(cmdStrs),
+                                                                         ','.join(failures)))
+
+        return replies
+
     def createSock(self):
         if self.simulated:
+            if self.sim is None:
+                self.sim = Labspheresim(self.actor, clock=self.clock)
             s = self.sim
         else:
             s = bufferedSocket.EthComm.createSock(self)
@@ -1,4 +1,7 @@
+import re
+
 logic = {'0': 'K', '1': 'J'}
+cmdPattern = re.compile(r'^[A-Z][0-9](?:[JK][0-9])*X$')
 
 
 def attenuator(value):
@@ -42,6 +45,13 @@ def init():
     return coll
 
 
+def validate(cmdStr):
+    if not cmdPattern.match(cmdStr):
+        raise ValueError('%s is not a valid labsphere command' % cmdStr)
+
+    return cmdStr
+
+
 def fullOpen():
     return attenuator(0)
 
@@ -0,0 +1,109 @@
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class PhotodiodeSampler(threading.Thread):
+    """Background thread which owns the labsphere socket and polls the photodiode at a fixed cadence.
+
+    Every read is published into the controller SmoothFlux buffer and in the latest attribute, a (timestamp, flux)
+    tuple which is replaced as a whole so that readers never need a lock.
+    Any other serial transaction is queued with execute() and run between two photodiode reads.
+    """
+
+    def __init__(self, controller, period):
+        threading.Thread.__init__(self, name='%sSampler' % controller.name, daemon=True)
+        self.controller = controller
+        self.period = period
+        self.clock = controller.clock
+
+        self.requests = queue.Queue()
+        self.abort = threading.Event()
+        self.latest = (np.nan, np.nan)
+
+        self.logger = logging.getLogger('%sSampler' % controller.name)
+
+    @property
+    def isActive(self):
+        return self.is_alive() and not self.abort.is_set()
+
+    @property
+    def age(self):
+        """Age of the latest sample in seconds, inf if nothing has been sampled yet."""
+        timestamp, flux = self.latest
+        return np.inf if np.isnan(timestamp) else self.clock.time() - timestamp
+
+    def execute(self, func, *args, timeout=60, **kwargs):
+        """| Run func in the sampler thread, so that it never collides with a photodiode read in progress.
+
+        :param func: callable to run.
+        :param timeout: max time to wait for the result.
+        :return: func return value
+        :raise: any exception raised by func.
+        """
+        if threading.current_thread() is self:
+            return func(*args, **kwargs)
+
+        future = Future()
+        self.requests.put((future, func, args, kwargs))
+        return future.result(timeout=timeout)
+
+    def sample(self):
+        """Read the photodiode once and publish the value."""
+        try:
+            flux = self.controller.photodiode(cmd=self.controller.actor.bcast)
+        except Exception as e:
+            self.logger.warning('photodiode read failed : %s', e)
+            flux = np.nan
+
+        timestamp = self.clock.time()
+        self.controller.flux.new(flux, timestamp=timestamp)
+        self.latest = (timestamp, flux)
+
+    def run(self):
+        nextSample = self.clock.time()
+
+        while not self.abort.is_set():
+            if self.clock.time() >= nextSample:
+                self.sample()
+                nextSample = self.clock.time() + self.period
+
+            try:
+                request = self.requests.get(timeout=self.clock.toReal(nextSample - self.clock.time()))
+            except queue.Empty:
+                continue
+
+            if request is None:
+                break
+
+            future, func, args, kwargs = request
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(func(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+
+        self.cancelPending()
+
+    def cancelPending(self):
+        """Fail all requests that have not been processed."""
+        while True:
+            try:
+                request = self.requests.get_nowait()
+            except queue.Empty:
+                break
+
+            if request is not None:
+                future, func, args, kwargs = request
+                if future.set_running_or_notify_cancel():
+                    future.set_exception(RuntimeError('photodiode sampler has been stopped'))
+
+    def stop(self, timeout=10):
+        """Stop sampling and wait for the thread to finish its current transaction."""
+        self.abort.set()
+        self.requests.put(None)
+        self.join(timeout=timeout)
@@ -1,12 +1,52 @@
 __author__ = 'alefur'
 import logging
+import os
+import select
+import threading
+import time
 
 import enuActor.utils.bufferedSocket as bufferedSocket
+import numpy as np
 from dcbActor.Simulators.mono import Monosim
+from dcbActor.utils import clock, controllerThread
+from dcbActor.utils.iostats import IOStats
+from dcbActor.utils.motionModel import MotionModel
 from enuActor.utils.fsmThread import FSMThread
 from opscore.utility.qstr import qstr
 
 
+class MonoState(object):
+    """Last known monochromator state, each field is timestamped so that only stale fields are re-queried."""
+    fields = ['error', 'shutter', 'grating', 'outport', 'wavelength']
+    defaultTtl = dict(error=5, shutter=60, grating=300, outport=300, wavelength=60)
+
+    def __init__(self, ttl=None, clock=clock.realClock):
+        self.clock = clock
+        self.ttl = dict(MonoState.defaultTtl)
+        self.ttl.update(ttl if ttl is not None else {})
+        self.values = dict()
+        self.timestamps = dict()
+
+    @property
+    def stale(self):
+        return [field for field in self.fields if self.isStale(field)]
+
+    def isStale(self, field):
+        return self.clock.time() - self.timestamps.get(field, -float('inf')) > self.ttl[field]
+
+    def update(self, field, value):
+        self.values[field] = value
+        self.timestamps[field] = self.clock.time()
+
+    def invalidate(self, *fields):
+        """Force fields (all fields if none given) to be re-queried at next status."""
+        for field in (fields if fields else self.fields):
+            self.timestamps.pop(field, None)
+
+    def __getitem__(self, field):
+        return self.values[field]
+
+
 class mono(FSMThread, bufferedSocket.EthComm):
     shutterCode = {'O': 'open', 'C': 'closed'}
 
@@ -16,19 +56,34 @@ class mono(FSMThread, bufferedSocket.EthComm):
         :param actor: spsaitActor
         :param name: controller name
         """
-        substates = ['IDLE', 'MOVING', 'OPENING', 'CLOSING', 'FAILED']
+        substates = ['IDLE', 'MOVING', 'TUNING', 'SWITCHING', 'OPENING', 'CLOSING', 'SCANNING', 'FAILED']
         events = [{'name': 'setgrating', 'src': 'IDLE', 'dst': 'MOVING'},
+                  {'name': 'setwave', 'src': 'IDLE', 'dst': 'TUNING'},
+                  {'name': 'setoutport', 'src': 'IDLE', 'dst': 'SWITCHING'},
                   {'name': 'openshutter', 'src': 'IDLE', 'dst': 'OPENING'},
                   {'name': 'closeshutter', 'src': 'IDLE', 'dst': 'CLOSING'},
-                  {'name': 'idle', 'src': ['MOVING', 'OPENING', 'CLOSING'], 'dst': 'IDLE'},
-                  {'name': 'fail', 'src': ['MOVING', 'OPENING', 'CLOSING'], 'dst': 'FAILED'},
+                  {'name': 'scan', 'src': 'IDLE', 'dst': 'SCANNING'},
+                  {'name': 'idle', 'src': ['MOVING', 'TUNING', 'SWITCHING', 'OPENING', 'CLOSING', 'SCANNING'],
+                   'dst': 'IDLE'},
+                  {'name': 'fail', 'src': ['MOVING', 'TUNING', 'SWITCHING', 'OPENING', 'CLOSING', 'SCANNING'],
+                   'dst': 'FAILED'},
                   ]
         FSMThread.__init__(self, actor, name, events=events, substates=substates, doInit=False)
 
         self.addStateCB('MOVING', self.setGrating)
+        self.addStateCB('TUNING', self.setWave)
+        self.addStateCB('SWITCHING', self.setOutport)
         self.addStateCB('OPENING', self.openShutter)
         self.addStateCB('CLOSING', self.closeShutter)
-        self.sim = Monosim()
+        self.addStateCB('SCANNING', self.scan)
+        self.sim = None
+        self.clock = clock.realClock
+        self.iostats = IOStats(self.name)
+        self.state = MonoState()
+        self.pollLock = threading.Lock()
+        self.motionModel = MotionModel()
+        self.motion = None
+        self.abortMotion = threading.Event()
 
         self.logger = logging.getLogger(self.name)
         self.logger.setLevel(loglevel)
@@ -51,6 +106,14 @@ class mono(FSMThread, bufferedSocket.EthComm):
         :raise: Exception Config file badly formatted
         """
         self.mode = self.actor.config.get('mono', 'mode') if mode is None else mode
+        self.clock = self.actor.clockFor(self.mode)
+        ttl = self.actor.config.get('mono', 'ttl', fallback='')
+        self.state = MonoState(ttl=dict([(field.strip(), float(value)) for field, value in
+                                         [item.split(':') for item in ttl.split(',') if item.strip()]]),
+                               clock=self.clock)
+        self.etaPeriod = self.actor.config.getfloat('mono', 'etaPeriod', fallback=1)
+        # simulated motions durations are those of Monosim, they must not train the model real motions use.
+        self.motionModel = MotionModel(None if self.simulated else os.path.join(self.actor.datadir, 'monoMotion.json'))
         bufferedSocket.EthComm.__init__(self,
                                         host=self.actor.config.get('mono', 'host'),
                                         port=int(self.actor.config.get('mono', 'port')),
@@ -80,62 +143,283 @@ class mono(FSMThread, bufferedSocket.EthComm):
 
         :param cmd: on going command,
         """
-        wavelength = float(self.getWave(cmd=cmd))
+        self.state.invalidate()
+        self.getWave(cmd=cmd)
 
     def getStatus(self, cmd):
-        error = self.getError(cmd=cmd)
-        shutter = self.getShutter(cmd=cmd)
-        grating = self.getGrating(cmd=cmd)
-        outport = int(self.getOutport(cmd=cmd))
-        wavelength = float(self.getWave(cmd=cmd))
+        self.refreshState(cmd=cmd)
+
+        error = self.state['error']
+        shutter = self.state['shutter']
+        grating = self.state['grating']
+        outport = self.state['outport']
+        wavelength = self.state['wavelength']
 
         gen = cmd.inform if error == 'OK' else cmd.warn
         gen('monoerror=%s' % qstr(error))
         gen('monograting=%s' % grating)
         gen('monochromator=%s,%d,%.3f' % (shutter, outport, wavelength))
+        self.lastData = time.time()
+
+        motion = self.motion
+        if motion is not None:
+            self.genMotionKey(cmd, motion, status='moving')
+
+    def refreshState(self, cmd):
+        """| Query stale fields only. Concurrent requests wait for the poll in progress and reuse its result.
+        | Nothing is queried while a motion is in progress, the controller only replies once it is completed.
+
+        :param cmd: on going command
+        """
+        getters = dict(error=self.getError, shutter=self.getShutter, grating=self.getGrating,
+                       outport=self.getOutport, wavelength=self.getWave)
+
+        with self.pollLock:
+            if self.motion is not None:
+                return
+
+            for field in self.state.stale:
+                getters[field](cmd=cmd)
 
     def openShutter(self, cmd):
-        self.sendOneCommand('shutteropen', cmd=cmd)
+        shutter = self.sendOneCommand('shutteropen', cmd=cmd)
+        self.state.update('shutter', self.shutterCode[shutter])
 
     def closeShutter(self, cmd):
-        self.sendOneCommand('shutterclose', cmd=cmd)
+        shutter = self.sendOneCommand('shutterclose', cmd=cmd)
+        self.state.update('shutter', self.shutterCode[shutter])
 
     def setGrating(self, cmd, gratingId):
-        self.sendOneCommand('setgrating,%d' % gratingId, cmd=cmd)
+        current = self.state.values.get('grating')
+        hasChanged = current is None or int(current.split(',')[0]) != gratingId
+        grating = self.move(cmd, 'grating', 'setgrating,%d' % gratingId, delta=hasChanged)
+        if grating is None:
+            return
+
+        self.state.update('grating', grating)
+        self.state.invalidate('wavelength')
+
+    def scan(self, cmd, waves, dwell=0., doFlux=False, doVaw=False):
+        """| Step the wavelength through waves, optionally sampling the labsphere photodiode and the qth power.
+        | monoScanPoint=i,wavelength,elapsed,flux,volts,amps,watts is generated for each point, NaN if not sampled.
+        | Points are saved in datadir as a (N, 7) array, same columns as monoScanPoint.
+
+        :param cmd: on going command
+        :param waves: wavelengths in nm.
+        :param dwell: time to wait in seconds after each move, before sampling.
+        :param doFlux: read labsphere photodiode.
+        :param doVaw: read monoqth voltage, current and power.
+        """
+        labsphere = self.scanSource('labsphere') if doFlux else None
+        monoqth = self.scanSource('monoqth') if doVaw else None
+
+        points = np.full((len(waves), 7), np.nan)
+        self.abortMotion.clear()
+        cmd.inform('monoScan=%d,%.3f,%.3f,%.1f' % (len(waves), waves[0], waves[-1], dwell))
+        start = self.clock.time()
+
+        try:
+            for i, wave in enumerate(waves):
+                if self.exitASAP:
+                    raise SystemExit()
+
+                if self.abortMotion.is_set():
+                    break
+
+                self.setWave(cmd, wavelength=wave)
+                if self.abortMotion.is_set():
+                    break
+                if dwell:
+                    self.clock.sleep(dwell)
+
+                points[i, :3] = i, self.state['wavelength'], self.clock.time() - start
+                # read in their own threads, so that their status or monitor never shares the line with the scan.
+                if labsphere is not None:
+                    points[i, 3] = controllerThread.execute(labsphere, labsphere.photodiode, cmd=cmd, timeout=60)
+                if monoqth is not None:
+                    points[i, 4:] = [float(value) for value in
+                                     controllerThread.execute(monoqth, monoqth.checkVaw, cmd, timeout=60)]
+
+                cmd.inform('monoScanPoint=%d,%.3f,%.2f,%.4f,%.2f,%.2f,%.2f' % tuple(points[i]))
+        finally:
+            path = self.saveScan(points[~np.isnan(points[:, 0])])
+            cmd.inform('monoScanFile=%s' % qstr(path))
+
+        if self.abortMotion.is_set():
+            cmd.warn('text="mono scan aborted after %d points"' % (~np.isnan(points[:, 0])).sum())
+
+    def scanSource(self, name):
+        try:
+            return self.actor.controllers[name]
+        except KeyError:
+            raise RuntimeError('%s controller is not connected.' % name)
+
+    def saveScan(self, points):
+        """| Save scan points in datadir/monoscans.
+
+        :return: path of the saved file.
+        """
+        dirname = os.path.join(self.actor.datadir, 'monoscans')
+        os.makedirs(dirname, exist_ok=True)
+
+        path = os.path.join(dirname, 'monoscan-%s.npy' % time.strftime('%Y%m%dT%H%M%S'))
+        np.save(path, points)
+        return path
 
     def getError(self, cmd):
-        return self.sendOneCommand('geterror', cmd=cmd)
+        error = self.sendOneCommand('geterror', cmd=cmd)
+        self.state.update('error', error)
+        return error
 
     def getShutter(self, cmd):
-        shutter = self.sendOneCommand('getshutter', cmd=cmd)
-        return self.shutterCode[shutter]
+        shutter = self.shutterCode[self.sendOneCommand('getshutter', cmd=cmd)]
+        self.state.update('shutter', shutter)
+        return shutter
 
     def getGrating(self, cmd):
-        return self.sendOneCommand('getgrating', cmd=cmd)
+        grating = self.sendOneCommand('getgrating', cmd=cmd)
+        self.state.update('grating', grating)
+        return grating
 
     def getOutport(self, cmd):
-        return self.sendOneCommand('getoutport', cmd=cmd)
+        outport = int(self.sendOneCommand('getoutport', cmd=cmd))
+        self.state.update('outport', outport)
+        return outport
 
     def getWave(self, cmd):
-        return self.sendOneCommand('getwave', cmd=cmd)
+        wavelength = float(self.sendOneCommand('getwave', cmd=cmd))
+        self.state.update('wavelength', wavelength)
+        return wavelength
 
     def setOutport(self, cmd, outportId):
-        self.sendOneCommand('setoutport,%d' % outportId, cmd=cmd)
+        current = self.state.values.get('outport')
+        outport = self.move(cmd, 'outport', 'setoutport,%d' % outportId, delta=current != outportId)
+        if outport is None:
+            return
+
+        self.state.update('outport', int(outport))
 
     def setWave(self, cmd, wavelength):
-        self.sendOneCommand('setwave,%.3f' % wavelength, cmd=cmd)
+        current = self.state.values.get('wavelength')
+        current = self.getWave(cmd=cmd) if current is None else current
+        delta = wavelength - current
+        wavelength = self.move(cmd, 'wave', 'setwave,%.3f' % wavelength, delta=delta)
+        if wavelength is None:
+            return
+
+        self.state.update('wavelength', float(wavelength))
+
+    def move(self, cmd, motion, cmdStr, delta):
+        """| Send a motion command and wait for its completion reply in short slices.
+        | monoMotion=motion,target,predicted,elapsed,status is generated every etaPeriod and once completed.
+        | The measured duration is fed back to the motion model. An aborted motion is reported on the command and does
+        | not fail the state machine, the controller going back to IDLE.
+
+        :param cmd: on going command
+        :param motion: wave|grating|outport.
+        :param cmdStr: motion command string.
+        :param delta: wavelength change in nm, or whether the grating/outport changes.
+        :return: controller reply, None if the motion was aborted.
+        :raise: UserWarning if the motion failed, timed out or if the actor is exiting.
+        """
+        predicted = self.motionModel.predict(motion, delta)
+        timeout = max(2 * predicted, predicted + 30)
+        if self.substates.current != 'SCANNING':
+            self.abortMotion.clear()
+
+        with self.pollLock:
+            start = self.clock.time()
+            self.motion = dict(motion=motion, target=cmdStr.split(',')[1], predicted=predicted, start=start)
+            try:
+                sock = self.connectSock()
+                self.logger.debug('sending %r', cmdStr)
+                sock.sendall(('%s%s' % (cmdStr, self.EOL)).encode('latin-1'))
+            except Exception:
+                self.motion = None
+                self.closeSock()
+                raise
+
+        status = 'failed'
+        try:
+            while not self.replyReady(sock, timeout=self.etaPeriod):
+                if self.exitASAP:
+                    status = 'aborted'
+                    raise UserWarning('mono %s motion aborted' % motion)
+
+                if self.abortMotion.is_set():
+                    status = 'aborted'
+                    break
+
+                if self.clock.time() - start > timeout:
+                    status = 'timeout'
+                    raise UserWarning('mono %s motion not completed after %ds' % (motion, timeout))
+
+                self.genMotionKey(cmd, self.motion, status='moving')
+
+            if status != 'aborted':
+                reply = self.ioBuffer.getOneResponse(sock=sock, cmd=cmd).strip()
+                self.logger.debug('received %r', reply)
+                error, ret = reply.split(',', 1)
+                if int(error):
+                    raise UserWarning(ret)
+
+                status = 'done'
+        except Exception:
+            # the completion reply of an unfinished motion would be read as the reply of the next command.
+            self.closeSock()
+            self.state.invalidate()
+            raise
+        finally:
+            elapsed = self.clock.time() - start
+            self.genMotionKey(cmd, self.motion, status=status)
+            self.iostats.record(cmdStr.split(',')[0], elapsed, bytesOut=len(cmdStr), failed=status != 'done')
+            self.motion = None
+
+        if status == 'aborted':
+            self.closeSock()
+            self.state.invalidate()
+            cmd.warn('text="mono %s motion aborted after %.1fs"' % (motion, elapsed))
+            return None
+
+        self.motionModel.update(motion, delta, elapsed)
+        return ret
+
+    def replyReady(self, sock, timeout):
+        """Wait at most timeout seconds for data to read."""
+        if self.simulated:
+            return self.sim.waitReply(timeout)
+
+        readers, writers, broken = select.select([sock], [], [], timeout)
+        return bool(readers)
+
+    def doAbort(self):
+        """Abort the motion or scan in progress, if any."""
+        if self.motion is not None or self.substates.current == 'SCANNING':
+            self.abortMotion.set()
+
+    def genMotionKey(self, cmd, motion, status):
+        cmd.inform('monoMotion=%s,%s,%.1f,%.1f,%s' % (motion['motion'], motion['target'], motion['predicted'],
+                                                     self.clock.time() - motion['start'], status))
 
     def sendOneCommand(self, cmdStr, doClose=False, cmd=None):
-        reply = bufferedSocket.EthComm.sendOneCommand(self, cmdStr=cmdStr, doClose=doClose, cmd=cmd)
-        error, ret = reply.split(',', 1)
+        try:
+            reply = self.iostats.call(cmdStr.split(',')[0], cmdStr, bufferedSocket.EthComm.sendOneCommand, self,
+                                      cmdStr=cmdStr, doClose=doClose, cmd=cmd)
+            error, ret = reply.split(',', 1)
+        except Exception:
+            self.state.invalidate()
+            raise
 
         if int(error):
+            self.state.invalidate()
             raise UserWarning(ret)
 
         return ret
 
     def createSock(self):
         if self.simulated:
+            if self.sim is None:
+                self.sim = Monosim(clock=self.clock)
             s = self.sim
         else:
             s = bufferedSocket.EthComm.createSock(self)
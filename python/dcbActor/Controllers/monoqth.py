@@ -1,8 +1,12 @@
 import logging
 import time
+from collections import deque
 
 import enuActor.utils.bufferedSocket as bufferedSocket
 from dcbActor.Simulators.monoqth import Monoqthsim
+from dcbActor.utils import clock
+from dcbActor.utils.iostats import IOStats
+from dcbActor.utils.publisher import Publisher
 from enuActor.utils.fsmThread import FSMThread
 
 
@@ -45,9 +49,12 @@ class monoqth(FSMThread, bufferedSocket.EthComm):
                   ]
         FSMThread.__init__(self, actor, name, events=events, substates=substates, doInit=True)
 
-        self.addStateCB('TURNING_OFF', self.turnOff)
-        self.addStateCB('WARMING', self.turnOn)
-        self.sim = Monoqthsim()
+        self.publisher = Publisher()
+        self.addStateCB('TURNING_OFF', self.publisher.flushing(self.turnOff))
+        self.addStateCB('WARMING', self.publisher.flushing(self.turnOn))
+        self.sim = None
+        self.clock = clock.realClock
+        self.iostats = IOStats(self.name)
 
         self.logger = logging.getLogger(self.name)
         self.logger.setLevel(loglevel)
@@ -70,6 +77,11 @@ class monoqth(FSMThread, bufferedSocket.EthComm):
         :raise: Exception Config file badly formatted
         """
         self.mode = self.actor.config.get('monoqth', 'mode') if mode is None else mode
+        self.clock = self.actor.clockFor(self.mode)
+        self.rampTimeout = self.actor.config.getfloat('monoqth', 'rampTimeout', fallback=60)
+        self.vawPeriod = self.actor.config.getfloat('monoqth', 'vawPeriod', fallback=5)
+        self.nominalPower = self.actor.config.getfloat('monoqth', 'nominalPower', fallback=40)
+        self.publisher.configure(self.actor.config)
         bufferedSocket.EthComm.__init__(self,
                                         host=self.actor.config.get('monoqth', 'host'),
                                         port=int(self.actor.config.get('monoqth', 'port')),
@@ -97,11 +109,12 @@ class monoqth(FSMThread, bufferedSocket.EthComm):
         cmd.inform('monoqthVAW=%s,%s,%s' % self.checkVaw(cmd))
 
     def getStatus(self, cmd):
-
+        self.publisher.flush(cmd)
         stb = self.getStb(cmd=cmd)
         state = 'on' if getBit(stb, 7) else 'off'
         cmd.inform('monoqth=%s,%d,%d' % (state, stb, self.getEsr(cmd=cmd)))
         cmd.inform('monoqthVAW=%s,%s,%s' % self.checkVaw(cmd))
+        self.lastData = time.time()
 
     def turnOn(self, cmd):
         self.turnQth(cmd=cmd, bool=True)
@@ -109,19 +122,82 @@ class monoqth(FSMThread, bufferedSocket.EthComm):
     def turnOff(self, cmd):
         self.turnQth(cmd=cmd, bool=False)
 
-    def turnQth(self, cmd, bool):
+    def turnQth(self, cmd, bool, minPeriod=0.2, maxPeriod=2, plateauTolerance=0.01, minPower=1.0):
+        """| Switch the lamp and track the ramp until the lamp_on bit matches or the power reaches its plateau.
+        | STB is polled at a rate adapted to the predicted remaining ramp time, VAW every vawPeriod seconds.
+
+        :param cmd: on going command
+        :param bool: True to turn on, False to turn off.
+        :raise: UserWarning if the ramp is not completed within rampTimeout.
+        """
         cmdStr = 'START' if bool else 'STOP'
         self.sendOneCommand(cmdStr, cmd=cmd)
 
-        cond = not bool
-        while cond != bool:
-            time.sleep(2)
+        start = self.clock.time()
+        nextVaw = start
+        startPower = None
+        progress = 0
+        powers = deque(maxlen=3)
+
+        while True:
+            elapsed = self.clock.time() - start
             try:
-                cond = self.getState(cmd)
-                cmd.inform('monoqthVAW=%s,%s,%s' % self.checkVaw(cmd))
+                if self.getState(cmd) == bool:
+                    break
+
+                if self.clock.time() >= nextVaw:
+                    vaw = self.checkVaw(cmd)
+                    self.publisher.inform(cmd, 'monoqthVAW', '%s,%s,%s', *[float(value) for value in vaw])
+                    nextVaw = self.clock.time() + self.vawPeriod
+
+                    power = float(vaw[2])
+                    startPower = power if startPower is None else startPower
+                    powers.append(power)
+                    progress = self.rampProgress(bool, power, startPower)
+                    cmd.inform('monoqthRamp=%d' % (100 * progress))
+
+                    if len(powers) == powers.maxlen and self.isPlateau(bool, powers, plateauTolerance, minPower):
+                        cmd.inform('text="monoqth power plateau reached at %.1fW"' % power)
+                        break
+
             except Exception as e:
                 cmd.warn('text=%s' % self.actor.strTraceback(e))
 
+            if elapsed > self.rampTimeout:
+                raise UserWarning('monoqth has not turned %s after %ds' % ('on' if bool else 'off', self.rampTimeout))
+
+            if self.exitASAP:
+                raise SystemExit()
+
+            remaining = elapsed * (1 - progress) / progress if progress > 0 else maxPeriod
+            self.clock.sleep(min(max(remaining / 2, minPeriod), maxPeriod, self.vawPeriod))
+
+        vaw = self.checkVaw(cmd)
+        self.publisher.flush(cmd)
+        cmd.inform('monoqthVAW=%s,%s,%s' % vaw)
+        cmd.inform('monoqthRamp=100')
+
+        if bool:
+            self.nominalPower = float(vaw[2])
+
+    def rampProgress(self, bool, power, startPower):
+        """| Ramp completion fraction, from the power relative to the last measured lamp on power.
+        """
+        if bool:
+            progress = power / self.nominalPower if self.nominalPower > 0 else 0
+        else:
+            progress = 1 - power / startPower if startPower > 0 else 1
+
+        return min(max(progress, 0), 1)
+
+    def isPlateau(self, bool, powers, tolerance, minPower):
+        """| Lamp is on if power is significant and stable, off if power is below minPower.
+        """
+        if not bool:
+            return max(powers) < minPower
+
+        return min(powers) > minPower and max(powers) - min(powers) < tolerance * max(powers)
+
     def getStb(self, cmd):
         stb = self.sendOneCommand('STB?', cmd=cmd)
 
@@ -141,6 +217,10 @@ class monoqth(FSMThread, bufferedSocket.EthComm):
         voltage = self.sendOneCommand('VOLTS?', cmd=cmd)
         current = self.sendOneCommand('AMPS?', cmd=cmd)
         power = self.sendOneCommand('WATTS?', cmd=cmd)
+        # simulated readings would be indistinguishable from real ones afterwards.
+        if not self.simulated:
+            self.actor.telemetry.recordMany([('monoqth.volts', voltage), ('monoqth.amps', current),
+                                             ('monoqth.watts', power)])
 
         return voltage, current, power
 
@@ -154,8 +234,14 @@ class monoqth(FSMThread, bufferedSocket.EthComm):
         for ind, val in self.ESR.items():
             cmd.inform('%s=%s' % (val, ('1' if getBit(esr, ind) else '0')))
 
+    def sendOneCommand(self, cmdStr, doClose=False, cmd=None):
+        return self.iostats.call(cmdStr, cmdStr, bufferedSocket.EthComm.sendOneCommand, self,
+                                 cmdStr=cmdStr, doClose=doClose, cmd=cmd)
+
     def createSock(self):
         if self.simulated:
+            if self.sim is None:
+                self.sim = Monoqthsim(clock=self.clock)
             s = self.sim
         else:
             s = bufferedSocket.EthComm.createSock(self)
@@ -1,28 +1,30 @@
 import random
 import socket
-import time
+
+from dcbActor.utils.clock import realClock
 
 
 class Labspheresim(socket.socket):
 
-    def __init__(self, actor):
+    def __init__(self, actor, clock=realClock):
         socket.socket.__init__(self, socket.AF_INET, socket.SOCK_STREAM)
         self.sendall = self.fakeSend
         self.recv = self.fakeRecv
 
         self.buf = []
+        self.clock = clock
         self.actor = actor
 
     def connect(self, server):
         (ip, port) = server
-        time.sleep(0.5)
+        self.clock.sleep(0.5)
         if type(ip) is not str:
             raise TypeError
         if type(port) is not int:
             raise TypeError
 
     def fakeSend(self, cmdStr):
-        time.sleep(0.1)
+        self.clock.sleep(0.1)
         cmdStr = cmdStr.decode()
 
         if cmdStr == 'O0X':
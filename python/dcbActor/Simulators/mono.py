@@ -1,10 +1,13 @@
 import socket
-import time
 
 import numpy as np
 
+from dcbActor.utils.clock import realClock
+
 
 class Monosim(socket.socket):
+    gratingMoveTime = 6.
+    waveSpeed = 100.
     errorCodes = {0: 'Command not understood',
                   1: 'System error (miscellaneous)',
                   2: 'Bad parameter used in Command',
@@ -18,27 +21,29 @@ class Monosim(socket.socket):
                   10: 'OK'
                   }
 
-    def __init__(self):
+    def __init__(self, clock=realClock):
         socket.socket.__init__(self, socket.AF_INET, socket.SOCK_STREAM)
         self.sendall = self.fakeSend
         self.recv = self.fakeRecv
 
         self.buf = []
+        self.clock = clock
         self.shutterOpen = False
         self.grating = 1
         self.outport = 1
         self.wavelength = 300
+        self.busyUntil = 0
 
     def connect(self, server):
         (ip, port) = server
-        time.sleep(0.5)
+        self.clock.sleep(0.5)
         if type(ip) is not str:
             raise TypeError
         if type(port) is not int:
             raise TypeError
 
     def fakeSend(self, cmdStr):
-        time.sleep(0.1)
+        self.clock.sleep(0.1)
         cmdStr = cmdStr.decode()
         cmdStr = cmdStr.split('\r\n')[0]
         funcname = cmdStr.split(',')[0]
@@ -73,8 +78,9 @@ class Monosim(socket.socket):
             self.buf.append('0,C\r\n')
 
         elif funcname == 'setgrating':
+            duration = self.gratingMoveTime if int(args[0]) != self.grating else 0
+            self.busyUntil = self.clock.time() + duration
             self.grating = int(args[0])
-            time.sleep(6)
             self.buf.append('0,%d,1200,600.00\r\n' % self.grating)
 
         elif funcname == 'setoutport':
@@ -82,16 +88,24 @@ class Monosim(socket.socket):
             self.buf.append('0,%d\r\n' % self.outport)
 
         elif funcname == 'setwave':
+            self.busyUntil = self.clock.time() + abs(float(args[0]) - self.wavelength) / self.waveSpeed
             self.wavelength = float(args[0])
             self.buf.append('0,%.3f\r\n' % self.wavelength)
 
         else:
             self.buf.append('1,unknown command %s\r\n' % cmdStr)
 
+    def waitReply(self, timeout):
+        """Wait at most timeout seconds for the motion in progress to complete, return True if completed."""
+        remaining = self.busyUntil - self.clock.time()
+        self.clock.sleep(max(min(remaining, timeout), 0))
+        return remaining <= timeout
+
     def fakeRecv(self, buffer_size):
+        self.clock.sleep(max(self.busyUntil - self.clock.time(), 0))
         ret = self.buf[0]
         self.buf = self.buf[1:]
         return str(ret).encode()
 
     def close(self):
-        pass
+        self.buf = []
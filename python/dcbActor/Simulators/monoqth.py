@@ -1,29 +1,31 @@
 import random
 import socket
-import time
 from threading import Thread
 
+from dcbActor.utils.clock import realClock
+
 
 class Monoqthsim(socket.socket):
-    def __init__(self):
+    def __init__(self, clock=realClock):
         socket.socket.__init__(self, socket.AF_INET, socket.SOCK_STREAM)
         self.sendall = self.fakeSend
         self.recv = self.fakeRecv
 
         self.buf = []
+        self.clock = clock
         self.qthOn = False
         self.power = 0
 
     def connect(self, server):
         (ip, port) = server
-        time.sleep(0.5)
+        self.clock.sleep(0.5)
         if type(ip) is not str:
             raise TypeError
         if type(port) is not int:
             raise TypeError
 
     def fakeSend(self, cmdStr):
-        time.sleep(0.1)
+        self.clock.sleep(0.1)
         cmdStr = cmdStr.decode()
 
         if cmdStr == 'STB?\r\n':
@@ -61,7 +63,7 @@ class Monoqthsim(socket.socket):
 
         while abs(self.power - powFin) > 0.05:
             self.power += round(coeff * tempo, 3)
-            time.sleep(tempo)
+            self.clock.sleep(tempo)
 
         self.qthOn = bool
 
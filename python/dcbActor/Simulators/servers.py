@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+
+"""
+Stand-alone TCP servers speaking the labsphere, mono, monoqth and aten protocols.
+
+Unlike the socket simulators, the actor connects to them in operation mode, so that the whole bufferedSocket path
+(framing, EOL handling, partial reads and timeouts) is exercised. Latency, jitter and bandwidth are configurable.
+
+    python -m dcbActor.Simulators.servers labsphere --port 4001 --latency 0.02 --jitter 0.005 --bandwidth 960
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import time
+
+
+class DeviceServer(object):
+    """Base server: reads framed requests, lets the device compute a reply and paces it on the wire.
+
+    Parameters
+    ----------
+    latency : `float`
+        Fixed delay in seconds added to every reply.
+    jitter : `float`
+        Max random delay in seconds added to every reply.
+    bandwidth : `float`
+        Link bandwidth in bytes per second, None for unlimited.
+    """
+    name = 'device'
+    terminator = b'\r\n'
+    replyEOL = '\r\n'
+
+    def __init__(self, latency=0., jitter=0., bandwidth=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.logger = logging.getLogger(self.name)
+
+    async def handle(self, reader, writer):
+        self.logger.info('client connected from %s', writer.get_extra_info('peername'))
+        try:
+            await self.greet(reader, writer)
+
+            while True:
+                try:
+                    request = await reader.readuntil(self.terminator)
+                except asyncio.IncompleteReadError:
+                    break
+
+                await self.transfer(len(request))
+                request = request[:-len(self.terminator)].decode('latin-1').strip()
+                self.logger.debug('received %r', request)
+
+                reply, duration = self.process(request)
+                await asyncio.sleep(duration + self.latency + random.uniform(0, self.jitter))
+                await self.send(writer, reply)
+        finally:
+            writer.close()
+
+    async def greet(self, reader, writer):
+        """Connection handshake, nothing by default."""
+        pass
+
+    async def send(self, writer, reply):
+        data = reply.encode('latin-1')
+        await self.transfer(len(data))
+        writer.write(data)
+        await writer.drain()
+        self.logger.debug('sent %r', reply)
+
+    async def transfer(self, nBytes):
+        """Time spent on the wire."""
+        if self.bandwidth:
+            await asyncio.sleep(nBytes / self.bandwidth)
+
+    def process(self, request):
+        """Return the reply to a request, and the time in seconds the device takes to execute it."""
+        raise NotImplementedError
+
+
+class LabsphereServer(DeviceServer):
+    """Labsphere controller, commands are terminated by X and replies by \\r\\n."""
+    name = 'labsphere'
+    terminator = b'X'
+
+    def __init__(self, lampFlux=3.2, **kwargs):
+        DeviceServer.__init__(self, **kwargs)
+        self.lampFlux = lampFlux
+        self.attenuator = 255
+        self.halogen = False
+
+    def process(self, request):
+        if request == 'O0':
+            offset = self.lampFlux if self.halogen else 0.001
+            flux = offset * (255 - self.attenuator) / 255 + random.gauss(mu=0.0, sigma=0.0003)
+            return '%g%s' % (flux, self.replyEOL), 0.
+
+        if request.startswith('P1'):
+            bits = ''.join(['1' if logic == 'J' else '0' for logic in request[2::2]])
+            self.attenuator = int(bits, 2)
+        elif request == 'P3J1':
+            self.halogen = True
+        elif request == 'P3K1':
+            self.halogen = False
+
+        return self.replyEOL, 0.
+
+
+class MonoServer(DeviceServer):
+    """Oriel monochromator, replies are error code and value, comma separated."""
+    name = 'mono'
+    gratingMoveTime = 6.
+    waveSpeed = 100.
+
+    def __init__(self, **kwargs):
+        DeviceServer.__init__(self, **kwargs)
+        self.shutterOpen = False
+        self.grating = 1
+        self.outport = 1
+        self.wavelength = 300.
+
+    def process(self, request):
+        funcname, *args = request.split(',')
+        duration = 0.
+
+        if funcname == 'geterror':
+            ret = 'OK'
+        elif funcname == 'getshutter':
+            ret = 'O' if self.shutterOpen else 'C'
+        elif funcname == 'getgrating':
+            ret = '%d,1200,600.00' % self.grating
+        elif funcname == 'getoutport':
+            ret = '%d' % self.outport
+        elif funcname == 'getwave':
+            ret = '%.3f' % self.wavelength
+        elif funcname in ['shutteropen', 'shutterclose']:
+            self.shutterOpen = funcname == 'shutteropen'
+            ret = 'O' if self.shutterOpen else 'C'
+        elif funcname == 'setgrating':
+            duration = self.gratingMoveTime if int(args[0]) != self.grating else 0.
+            self.grating = int(args[0])
+            ret = '%d,1200,600.00' % self.grating
+        elif funcname == 'setoutport':
+            self.outport = int(args[0])
+            ret = '%d' % self.outport
+        elif funcname == 'setwave':
+            duration = abs(float(args[0]) - self.wavelength) / self.waveSpeed
+            self.wavelength = float(args[0])
+            ret = '%.3f' % self.wavelength
+        else:
+            return '1,unknown command %s%s' % (request, self.replyEOL), duration
+
+        return '0,%s%s' % (ret, self.replyEOL), duration
+
+
+class MonoqthServer(DeviceServer):
+    """Monochromator QTH lamp power supply, replies are terminated by \\r."""
+    name = 'monoqth'
+    replyEOL = '\r'
+    rampTime = 10.
+    nominalPower = 40.
+
+    def __init__(self, **kwargs):
+        DeviceServer.__init__(self, **kwargs)
+        self.rampStart = (0., 0.)
+        self.target = 0.
+
+    @property
+    def power(self):
+        """Lamp power, linearly ramping towards target."""
+        startTime, startPower = self.rampStart
+        fraction = min((time.time() - startTime) / self.rampTime, 1)
+        return startPower + (self.target - startPower) * fraction
+
+    def process(self, request):
+        if request == 'STB?':
+            ret = 'STB%s' % ('A1' if self.target and self.power == self.target else '21')
+        elif request == 'ESR?':
+            ret = 'ESR01'
+        elif request == 'AMPS?':
+            ret = '%.1f' % (self.power / 20)
+        elif request == 'VOLTS?':
+            ret = '%.1f' % (20. if self.power else 0.)
+        elif request == 'WATTS?':
+            ret = '%.1f' % (self.power + random.gauss(mu=0, sigma=0.02))
+        elif request in ['START', 'STOP']:
+            self.rampStart = (time.time(), self.power)
+            self.target = self.nominalPower if request == 'START' else 0.
+            ret = ''
+        else:
+            ret = 'ERR'
+
+        return '%s%s' % (ret, self.replyEOL), 0.
+
+
+class AtenServer(DeviceServer):
+    """Aten PDU telnet interface, with login and a prompt after every reply."""
+    name = 'aten'
+    prompt = '\r\n> '
+
+    def __init__(self, outlets=15, **kwargs):
+        DeviceServer.__init__(self, **kwargs)
+        self.outlets = dict([('%02d' % (i + 1), 'off') for i in range(outlets)])
+
+    async def greet(self, reader, writer):
+        await self.send(writer, 'Login: ')
+        await reader.readuntil(self.terminator)
+        await self.send(writer, 'Password: ')
+        await reader.readuntil(self.terminator)
+        await self.send(writer, '\r\nLogged in successfully\r\n%s' % self.prompt)
+
+    def process(self, request):
+        words = request.split()
+
+        if words[:2] == ['read', 'status'] and len(words) >= 3:
+            ret = self.outlets.get(words[2][1:], 'unknown')
+        elif words[:3] == ['read', 'meter', 'dev']:
+            ret = dict(volt='230.0', curr='%.2f' % (0.1 * list(self.outlets.values()).count('on')),
+                       pow='%.1f' % (23 * list(self.outlets.values()).count('on'))).get(words[3], '0')
+        elif words[:1] == ['sw'] and len(words) >= 3:
+            self.outlets[words[1][1:]] = words[2]
+            ret = 'Outlet<%s> command is setting' % words[1][1:]
+        else:
+            ret = 'Invalid command'
+
+        return '%s%s%s' % (ret, self.replyEOL, self.prompt), 0.
+
+
+servers = dict(labsphere=LabsphereServer, mono=MonoServer, monoqth=MonoqthServer, aten=AtenServer)
+defaultPorts = dict(labsphere=4001, monoqth=4002, mono=4003, aten=2323)
+
+
+async def serve(devices, host='localhost', ports=None, **kwargs):
+    """Start one server per device and serve forever."""
+    ports = dict(defaultPorts, **(ports if ports is not None else {}))
+    tcpServers = []
+
+    for device in devices:
+        server = servers[device](**kwargs)
+        tcpServers.append(await asyncio.start_server(server.handle, host, ports[device]))
+        server.logger.info('listening on %s:%d', host, ports[device])
+
+    await asyncio.gather(*[tcpServer.serve_forever() for tcpServer in tcpServers])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('devices', nargs='+', choices=list(servers.keys()), help='devices to serve')
+    parser.add_argument('--host', default='localhost', type=str, help='interface to listen on')
+    parser.add_argument('--port', default=None, type=int, help='port, only if a single device is served')
+    parser.add_argument('--latency', default=0., type=float, help='fixed reply delay in seconds')
+    parser.add_argument('--jitter', default=0., type=float, help='max random reply delay in seconds')
+    parser.add_argument('--bandwidth', default=None, type=float, help='link bandwidth in bytes per second')
+    parser.add_argument('--logLevel', default=logging.INFO, type=int, help='logging level')
+    args = parser.parse_args()
+
+    if args.port is not None and len(args.devices) != 1:
+        parser.error('--port can only be used with a single device')
+
+    logging.basicConfig(level=args.logLevel, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    ports = {args.devices[0]: args.port} if args.port is not None else None
+
+    asyncio.run(serve(args.devices, host=args.host, ports=ports,
+                      latency=args.latency, jitter=args.jitter, bandwidth=args.bandwidth))
+
+
+if __name__ == '__main__':
+    main()
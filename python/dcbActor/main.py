@@ -1,10 +1,16 @@
 #!/usr/bin/env python
 
 import argparse
-import configparser
+import atexit
 import logging
+import os
+import threading
 
-import dcbActor.utils.makeLamDesign as lamConfig
+from dcbActor.utils import clock
+from dcbActor.utils.fiberConfig import FiberConfig
+from dcbActor.utils.iostats import IOStatsWriter
+from dcbActor.utils.scheduler import MonitorScheduler
+from dcbActor.utils.telemetry import TelemetryWriter
 from enuActor.main import enuActor
 
 
@@ -16,6 +22,18 @@ class DcbActor(enuActor):
                           productName=productName,
                           configFile=configFile)
 
+        self._fiberConfig = None
+        self._simClock = None
+        self._telemetry = None
+        self.connectLock = threading.RLock()
+
+        iostatsPeriod = self.config.getfloat(self.name, 'iostatsPeriod', fallback=0)
+        if iostatsPeriod > 0:
+            IOStatsWriter(self, datadir=self.datadir, period=iostatsPeriod).start()
+
+        self.scheduler = MonitorScheduler(self, jitter=self.config.getfloat(self.name, 'monitorJitter', fallback=1))
+        self.scheduler.start()
+
     @property
     def arcs(self):
         return {"neon": self.controllers['aten'].state["neon"],
@@ -26,11 +44,67 @@ class DcbActor(enuActor):
                 "deuterium": self.controllers['aten'].state["deuterium"],
                 "halogen": self.controllers['labsphere'].halogen}
 
+    @property
+    def datadir(self):
+        return os.path.expandvars(self.config.get(self.name, 'datadir'))
+
+    @property
+    def simClock(self):
+        """Time base shared by all controllers and simulators in simulation mode."""
+        if self._simClock is None:
+            speed = self.config.getfloat(self.name, 'simulationSpeed', fallback=1)
+            self._simClock = clock.VirtualClock(speed=speed)
+
+        return self._simClock
+
+    def clockFor(self, mode):
+        """Return the time base to use for a controller in operation or simulation mode."""
+        return self.simClock if mode == 'simulation' else clock.realClock
+
+    @property
+    def fiberConfig(self):
+        if self._fiberConfig is None:
+            path = self.config.get(self.name, 'fiberConfig', fallback='/software/ait/fiberConfig.cfg')
+            self._fiberConfig = FiberConfig(path)
+
+        return self._fiberConfig
+
+    @property
+    def telemetry(self):
+        """Flux and power telemetry writer, appending to datadir/telemetry."""
+        if self._telemetry is None:
+            self._telemetry = TelemetryWriter(self.datadir)
+            # trim the current daily file preallocated space on exit.
+            atexit.register(self._telemetry.close)
+
+        return self._telemetry
+
+    def connect(self, *args, **kwargs):
+        """Attach a controller, serialised so that concurrent startups never update the controllers registry at once."""
+        with self.connectLock:
+            return enuActor.connect(self, *args, **kwargs)
+
+    def disconnect(self, *args, **kwargs):
+        """Detach a controller, serialised with connect."""
+        with self.connectLock:
+            return enuActor.disconnect(self, *args, **kwargs)
+
+    @property
+    def lampCombination(self):
+        """Lamps currently on, as a sorted + separated string, unknown if aten or labsphere state is not available."""
+        try:
+            return self.combinationOf(self.arcs)
+        except KeyError:
+            return 'unknown'
+
+    @staticmethod
+    def combinationOf(arcs):
+        """Lamps on in an arcs state dict, as a sorted + separated string."""
+        lamps = sorted([lamp for lamp, state in arcs.items() if state == 'on'])
+        return '+'.join(lamps) if lamps else 'none'
+
     def pfsDesignId(self, cmd):
-        conf = configparser.ConfigParser()
-        conf.read_file(open('/software/ait/fiberConfig.cfg'))
-        fibers = [fib.strip() for fib in conf.get('current', 'fibers').split(',')]
-        pfiDesignId = lamConfig.hashColors(fibers)
+        fibers, pfiDesignId = self.fiberConfig.load()
 
         cmd.inform('fiberConfig="%s"' % ';'.join(fibers))
         cmd.inform('designId=0x%016x' % pfiDesignId)
@@ -0,0 +1,102 @@
+"""
+Labsphere attenuator transfer function per lamp combination, measured by labsphere calibrate and persisted in datadir.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+
+class AttenuatorCalibration(object):
+    """256 entries lookup table of the flux transmitted at each attenuator setting, normalised to its maximum.
+
+    Parameters
+    ----------
+    path : `str`
+        Json file the lookup tables are persisted in.
+    """
+    settings = np.arange(256)
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.tables = self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as calibFile:
+                return json.load(calibFile)
+        except FileNotFoundError:
+            return dict()
+
+    def get(self, combination):
+        """Calibration of a lamp combination, None if it has never been calibrated."""
+        with self.lock:
+            table = self.tables.get(combination)
+            return dict(table) if table is not None else None
+
+    def update(self, combination, settings, fluxes):
+        """| Interpolate measured points over all settings, normalise and persist.
+
+        :param combination: lamp combination.
+        :param settings: measured attenuator settings.
+        :param fluxes: flux measured at each setting.
+        :return: new calibration.
+        """
+        order = np.argsort(settings)
+        lut = np.interp(self.settings, np.array(settings, dtype=float)[order], np.array(fluxes, dtype=float)[order])
+        reference = lut.max()
+        if not reference > 0:
+            raise ValueError('no flux measured during calibration')
+
+        table = dict(lut=[float(value) for value in np.round(lut / reference, 6)], reference=float(reference),
+                     nPoints=len(settings), updated=time.time())
+
+        with self.lock:
+            self.tables[combination] = table
+            self.save()
+
+        return dict(table)
+
+    def settingFor(self, combination, target, currentSetting=None, currentFlux=None, minTransmission=0.05):
+        """| Attenuator setting whose expected flux is the closest to target.
+        | The lookup table is scaled to the current flux if the attenuator transmits enough light to measure it,
+        | so that lamp intensity drifts since the calibration are accounted for, to the calibration reference flux
+        | otherwise.
+
+        :param combination: lamp combination.
+        :param target: requested flux.
+        :param currentSetting: current attenuator setting.
+        :param currentFlux: flux measured at the current setting.
+        :return: setting, expected flux.
+        :raise: KeyError if the lamp combination has not been calibrated.
+        """
+        table = self.get(combination)
+        if table is None:
+            raise KeyError('%s attenuator has not been calibrated, run labsphere calibrate first' % combination)
+
+        lut = np.array(table['lut'])
+        scale = table['reference']
+        if currentSetting in range(256) and lut[currentSetting] > minTransmission and currentFlux > 0:
+            scale = currentFlux / lut[currentSetting]
+
+        expected = scale * lut
+        setting = int(np.argmin(np.abs(expected - target)))
+        return setting, expected[setting]
+
+    def save(self):
+        """Write tables to a temporary file then rename it, so a crash never leaves a truncated file."""
+        dirname = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(dirname, exist_ok=True)
+        fd, tmpPath = tempfile.mkstemp(prefix='.attenuatorCalibration.', dir=dirname)
+        try:
+            with os.fdopen(fd, 'w') as tmpFile:
+                json.dump(self.tables, tmpFile, indent=2, sort_keys=True)
+            os.replace(tmpPath, self.path)
+        except Exception:
+            os.unlink(tmpPath)
+            raise
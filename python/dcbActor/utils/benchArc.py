@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+
+"""
+Executable script to benchmark the arc, mono and monoqth sequences against the simulators.
+
+The controllers run in simulation mode with stubbed hub and command objects. Wall time and serial round trips are
+recorded per phase and written as json:
+
+    python -m dcbActor.utils.benchArc --repeat 3 --speed 10 --output bench.json
+"""
+
+import argparse
+import configparser
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import dcbActor.Controllers.labsphere as labsphere
+import dcbActor.Controllers.mono as mono
+import dcbActor.Controllers.monoqth as monoqth
+from dcbActor.utils import clock
+from dcbActor.utils.telemetry import TelemetryWriter
+
+
+class Recorder(object):
+    """Accumulate wall time, calls and round trips per phase."""
+
+    def __init__(self):
+        self.phases = defaultdict(lambda: dict(wall=0., calls=0, roundTrips=0))
+        self.current = []
+
+    @contextmanager
+    def phase(self, name):
+        self.current.append(name)
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.current.pop()
+            self.phases[name]['wall'] += time.time() - start
+            self.phases[name]['calls'] += 1
+
+    def roundTrip(self):
+        for name in set(self.current):
+            self.phases[name]['roundTrips'] += 1
+
+    def report(self):
+        return dict([(name, dict(phase)) for name, phase in self.phases.items()])
+
+
+class StubCmd(object):
+    """Command stub, keeps every reply with its timestamp."""
+
+    def __init__(self, verbose=False):
+        self.replies = []
+        self.verbose = verbose
+
+    def reply(self, flag, response):
+        self.replies.append((time.time(), flag, response))
+        if self.verbose:
+            sys.stderr.write('%s %s\n' % (flag, response))
+
+    def inform(self, response):
+        self.reply('i', response)
+
+    def warn(self, response):
+        self.reply('w', response)
+
+    def finish(self, response=''):
+        self.reply(':', response)
+
+    def fail(self, response=''):
+        self.reply('f', response)
+
+
+class StubCmdVar(object):
+    didFail = False
+
+
+class StubCmdr(object):
+    """Handle dcb power calls by switching the stub aten outlets."""
+
+    def __init__(self, actor):
+        self.actor = actor
+
+    def call(self, actor, cmdStr, forUserCmd=None, timeLim=None):
+        with self.actor.recorder.phase('power'):
+            words = cmdStr.split()
+            for word in words[1:]:
+                state, lamps = word.split('=')
+                for lamp in lamps.split(','):
+                    self.actor.aten.state[lamp] = state
+
+            self.actor.simClock.sleep(self.actor.powerTime)
+
+        return StubCmdVar()
+
+
+class StubAten(object):
+    def __init__(self):
+        self.state = dict([(lamp, 'off') for lamp in ['neon', 'hgar', 'xenon', 'krypton', 'argon', 'deuterium']])
+
+
+class StubActor(object):
+    """Minimal actor: config, controllers, lamp states and a hub stub."""
+
+    def __init__(self, configFile, speed=1., powerTime=1., verbose=False):
+        self.name = 'dcb'
+        self.config = configparser.ConfigParser()
+        self.config.read(configFile)
+        self.bcast = StubCmd(verbose=verbose)
+        self.cmdr = StubCmdr(self)
+        self.aten = StubAten()
+        self.controllers = dict(aten=self.aten)
+        self.recorder = Recorder()
+        self.simClock = clock.VirtualClock(speed=speed)
+        self.powerTime = powerTime
+        self.datadir = tempfile.mkdtemp(prefix='benchArc')
+        self.telemetry = TelemetryWriter(self.datadir)
+
+    @property
+    def arcs(self):
+        arcs = dict(self.aten.state)
+        arcs['halogen'] = self.controllers['labsphere'].halogen
+        return arcs
+
+    @property
+    def lampCombination(self):
+        lamps = sorted([lamp for lamp, state in self.arcs.items() if state == 'on'])
+        return '+'.join(lamps) if lamps else 'none'
+
+    def clockFor(self, mode):
+        return self.simClock if mode == 'simulation' else clock.realClock
+
+    def strTraceback(self, e):
+        return '"%s"' % e
+
+
+def benchController(cls, phases):
+    """Return a subclass of a controller class whose state callbacks and serial I/O are recorded."""
+
+    class BenchController(cls):
+        def sendOneCommand(self, *args, **kwargs):
+            self.actor.recorder.roundTrip()
+            return cls.sendOneCommand(self, *args, **kwargs)
+
+    def timed(name, method):
+        def wrapper(self, *args, **kwargs):
+            with self.actor.recorder.phase(name):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    for name, methodName in phases.items():
+        setattr(BenchController, methodName, timed(name, getattr(cls, methodName)))
+
+    if hasattr(cls, 'move'):
+        def move(self, *args, **kwargs):
+            self.actor.recorder.roundTrip()
+            return cls.move(self, *args, **kwargs)
+
+        BenchController.move = move
+
+    if hasattr(cls, '_transaction'):
+        def _transaction(self, cmdStrs, *args, **kwargs):
+            self.actor.recorder.roundTrip()
+            return cls._transaction(self, cmdStrs, *args, **kwargs)
+
+        BenchController._transaction = _transaction
+
+    return BenchController
+
+
+def startController(actor, cls, name, cmd, doInit=False):
+    """Load, connect, test and optionally init a controller in simulation mode without starting its thread."""
+    controller = cls(actor, name)
+    actor.controllers[name] = controller
+    controller._loadCfg(cmd, mode='simulation')
+    controller._openComm(cmd)
+    controller._testComm(cmd)
+    if doInit:
+        controller._init(cmd)
+    return controller
+
+
+def runArc(actor, cmd, lamps, attenuator):
+    """arc on=lamps attenuator=attenuator, then arc off=lamps, as LabsphereCmd.switch does."""
+    controller = actor.controllers['labsphere']
+
+    with actor.recorder.phase('arcOn'):
+        controller.switchArcs(cmd, arcOn=lamps, arcOff=[], attenuator=attenuator)
+
+    with actor.recorder.phase('arcOff'):
+        controller.switchArcs(cmd, arcOn=[], arcOff=lamps)
+
+
+def runMono(actor, cmd, waves):
+    controller = actor.controllers['mono']
+    for wave in waves:
+        with actor.recorder.phase('setWave'):
+            controller.setWave(cmd, wavelength=wave)
+            controller.getStatus(cmd)
+
+
+def runMonoqth(actor, cmd):
+    controller = actor.controllers['monoqth']
+    with actor.recorder.phase('monoqthOn'):
+        controller.turnOn(cmd)
+        controller.getStatus(cmd)
+
+    controller.turnOff(cmd)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    defaultConfig = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'etc', 'dcb.cfg')
+    parser.add_argument('--config', default=defaultConfig, type=str, help='dcb.cfg to use')
+    parser.add_argument('--repeat', default=1, type=int, help='number of runs')
+    parser.add_argument('--speed', default=1., type=float, help='simulation clock speed')
+    parser.add_argument('--powerTime', default=1., type=float, help='simulated aten power call duration')
+    parser.add_argument('--lamps', default='neon,hgar', type=str, help='arc lamps to switch on')
+    parser.add_argument('--attenuator', default=100, type=int, help='final attenuator value')
+    parser.add_argument('--waves', default='400,500,600,700', type=str, help='mono wavelengths')
+    parser.add_argument('--output', default=None, type=str, help='json output file, stdout if None')
+    parser.add_argument('--verbose', action='store_true', help='print replies on stderr')
+    args = parser.parse_args()
+
+    actor = StubActor(args.config, speed=args.speed, powerTime=args.powerTime, verbose=args.verbose)
+    cmd = actor.bcast
+
+    labsphereCls = benchController(labsphere.labsphere, dict(SWITCHING='switchHalogen', MOVING='moveAttenuator',
+                                                             WARMING='stabFlux'))
+    monoCls = benchController(mono.mono, dict(MOVING='setGrating', TUNING='setWave'))
+    monoqthCls = benchController(monoqth.monoqth, dict(WARMING='turnOn', TURNING_OFF='turnOff'))
+
+    with actor.recorder.phase('startup'):
+        startController(actor, labsphereCls, 'labsphere', cmd, doInit=True)
+        startController(actor, monoCls, 'mono', cmd)
+        startController(actor, monoqthCls, 'monoqth', cmd)
+
+    runs = []
+    for i in range(args.repeat):
+        actor.recorder = Recorder()
+        start = time.time()
+        runArc(actor, cmd, lamps=args.lamps.split(','), attenuator=args.attenuator)
+        runMono(actor, cmd, waves=[float(wave) for wave in args.waves.split(',')])
+        runMonoqth(actor, cmd)
+        runs.append(dict(wall=time.time() - start, phases=actor.recorder.report()))
+
+    report = dict(speed=args.speed, lamps=args.lamps, attenuator=args.attenuator, waves=args.waves, runs=runs,
+                  warnings=[response for t, flag, response in cmd.replies if flag == 'w'])
+
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+    else:
+        with open(args.output, 'w') as outFile:
+            json.dump(report, outFile, indent=2)
+
+
+if __name__ == '__main__':
+    main()
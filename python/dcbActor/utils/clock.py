@@ -0,0 +1,46 @@
+"""
+Time bases injected into controllers and simulators, so that simulated sequences can run faster than real time.
+"""
+
+import time
+
+
+class Clock(object):
+    """Real time base."""
+    speed = 1.0
+
+    def time(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        time.sleep(max(seconds, 0))
+
+    def toReal(self, seconds):
+        """Convert a duration in clock seconds to real seconds, eg for socket or queue timeouts."""
+        return max(seconds, 0) / self.speed
+
+
+class VirtualClock(Clock):
+    """Virtual time base, starting at the real time of creation and flowing speed times faster than real time.
+
+    Parameters
+    ----------
+    speed : `float`
+        Acceleration factor, 1 runs at real time pace.
+    """
+
+    def __init__(self, speed=1.0):
+        if not speed > 0:
+            raise ValueError('clock speed must be positive')
+
+        self.speed = float(speed)
+        self.origin = time.time()
+
+    def time(self):
+        return self.origin + (time.time() - self.origin) * self.speed
+
+    def sleep(self, seconds):
+        time.sleep(self.toReal(seconds))
+
+
+realClock = Clock()
@@ -0,0 +1,46 @@
+"""
+Synchronous calls into a controller thread, so that its device I/O never collides with status or monitor requests.
+"""
+
+import threading
+from concurrent.futures import Future, TimeoutError
+
+
+def execute(controller, func, *args, timeout=None, **kwargs):
+    """| Run func in the controller thread, queued behind its pending messages, and wait for the result.
+
+    :param controller: FSMThread controller.
+    :param func: callable to run.
+    :param timeout: max time to wait for the result, None to wait as long as the controller thread is alive.
+    :return: func return value
+    :raise: any exception raised by func, RuntimeError if the controller thread has stopped.
+    """
+    if threading.current_thread() is controller:
+        return func(*args, **kwargs)
+
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(func(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        except BaseException:
+            # SystemExit from a stopping controller must still stop its own thread.
+            future.set_exception(RuntimeError('%s has been stopped' % controller.name))
+            raise
+
+    controller.putMsg(run)
+    waited = 0
+
+    while True:
+        try:
+            return future.result(timeout=1)
+        except TimeoutError:
+            waited += 1
+
+        if not controller.is_alive() or (timeout is not None and waited >= timeout):
+            if future.cancel():
+                raise RuntimeError('%s did not run %s' % (controller.name, func.__name__))
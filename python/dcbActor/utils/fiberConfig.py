@@ -0,0 +1,94 @@
+"""
+Cached access to the fiber configuration file, from which the current pfsDesignId is computed.
+"""
+
+import configparser
+import os
+import tempfile
+import threading
+
+import dcbActor.utils.makeLamDesign as lamConfig
+
+
+class FiberConfig(object):
+    """Parsed fibers and designId, cached until the file modification time or size changes.
+
+    Parameters
+    ----------
+    path : `str`
+        Path to the fiber configuration file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.signature = None
+        self._fibers = []
+        self._designId = None
+
+    @property
+    def fibers(self):
+        """Current fiber bundles, as a list of colors."""
+        return self.load()[0]
+
+    @property
+    def designId(self):
+        """pfsDesignId of the current fiber bundles."""
+        return self.load()[1]
+
+    def load(self):
+        """Parse the file if it has changed since the last call.
+
+        Returns
+        -------
+        fibers : `list` of `str`
+            Current fiber bundles.
+        designId : `int`
+            Matching pfsDesignId.
+        """
+        stat = os.stat(self.path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        with self.lock:
+            if signature != self.signature:
+                conf = self.read()
+                fibers = [fib.strip() for fib in conf.get('current', 'fibers').split(',')]
+                self._fibers, self._designId = fibers, lamConfig.hashColors(fibers)
+                self.signature = signature
+
+            return list(self._fibers), self._designId
+
+    def read(self):
+        conf = configparser.ConfigParser()
+        with open(self.path) as cfgFile:
+            conf.read_file(cfgFile)
+
+        return conf
+
+    def write(self, fibers):
+        """Set the current fiber bundles, the file is replaced atomically so readers never see a partial file.
+
+        Parameters
+        ----------
+        fibers : iterable of `str`
+            Current fiber bundles.
+        """
+        with self.lock:
+            conf = self.read()
+            conf.set('current', 'fibers', ','.join([fib.strip() for fib in fibers]))
+
+            dirname, basename = os.path.split(os.path.abspath(self.path))
+            fd, tmpPath = tempfile.mkstemp(prefix='.%s.' % basename, dir=dirname)
+            try:
+                with os.fdopen(fd, 'w') as tmpFile:
+                    conf.write(tmpFile)
+                    tmpFile.flush()
+                    os.fsync(tmpFile.fileno())
+
+                os.chmod(tmpPath, os.stat(self.path).st_mode & 0o777)
+                os.replace(tmpPath, self.path)
+            except Exception:
+                os.unlink(tmpPath)
+                raise
+
+            self.signature = None
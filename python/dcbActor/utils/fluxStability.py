@@ -0,0 +1,260 @@
+"""
+Predictive flux stabilisation detector, used to decide when a lamp warmup is over.
+"""
+
+import numpy as np
+
+
+class StabilityDetector(object):
+    """Fit the warmup curve as samples arrive and predict the residual flux drift.
+
+    The slope is fitted by least squares over a window growing with the warmup, half of the elapsed time but never
+    shorter than the legacy window. The decay time of an exponential approach is estimated from the slopes of the two
+    halves of that window, it is the upper bound given by their standard errors and only trusted if both slopes are
+    significant, more than twice their standard error. The residual drift is the upper bound of the slope integrated
+    over the remaining time, the last half slope over the decay time if measured, the whole window slope over the
+    window duration otherwise, capped by horizon.
+
+    Once the decay time of the lamp combination has been learned from previous warmups, the whole warmup is also fitted
+    by an exponential approach with that decay time, whose residual excursion is known far more precisely than the
+    slope ratio allows. It is only used if it fits the samples as well as the trailing line does.
+
+    The legacy criterion is replayed on the same samples, and the flux is stable as soon as either decides, so the
+    predictive detection never ends later than the legacy one would have.
+
+    Parameters
+    ----------
+    tolerance : `float`
+        Maximum predicted residual drift, relative to the flux level.
+    minFlux : `float`
+        Minimum flux level for a lamp to be considered on.
+    noiseTolerance : `float`
+        Maximum scatter around the fitted slope, relative to the flux level.
+    window : `int`
+        Minimum number of samples of the fit window.
+    horizon : `float`
+        Maximum drift integration time in seconds.
+    fastPeriod, slowPeriod : `float`
+        Sampling periods far from and close to convergence.
+    """
+    # legacy criterion, readings period, number of readings, buffer capacity and outdated window.
+    legacyPeriod = 3
+    legacySamples = 8
+    legacyCapacity = 9
+    legacyOutdated = 30
+
+    def __init__(self, tolerance=0.01, minFlux=0.01, noiseTolerance=0.02, window=6, horizon=60,
+                 fastPeriod=1, slowPeriod=3):
+        self.tolerance = tolerance
+        self.minFlux = minFlux
+        self.noiseTolerance = noiseTolerance
+        self.window = window
+        self.horizon = horizon
+        self.fastPeriod = fastPeriod
+        self.slowPeriod = slowPeriod
+
+        self.timestamps = []
+        self.values = []
+        self.level = np.nan
+        self.drift = np.inf
+        self.noise = np.inf
+        self.tau = np.nan
+        self.priorTau = np.nan
+
+        self.legacyTimes = []
+        self.legacyValues = []
+        self.legacyAt = np.nan
+
+    @property
+    def nSamples(self):
+        return len(self.values)
+
+    @property
+    def minWindow(self):
+        """Legacy window duration in seconds."""
+        return (self.legacySamples - 1) * self.legacyPeriod
+
+    @property
+    def isPredicted(self):
+        noiseLimit = max(self.noiseTolerance * self.level, 0.002)
+        return self.level > self.minFlux and self.drift < self.tolerance and self.noise < noiseLimit
+
+    @property
+    def isLegacyStable(self):
+        return not np.isnan(self.legacyAt)
+
+    @property
+    def isStable(self):
+        return self.isPredicted or self.isLegacyStable
+
+    @property
+    def nextPeriod(self):
+        """Sampling period, fast far from convergence and slower as the predicted drift reaches tolerance."""
+        closeness = min(self.tolerance / self.drift, 1) if self.drift > 0 else 1
+        return self.fastPeriod + (self.slowPeriod - self.fastPeriod) * closeness
+
+    def tune(self, profile):
+        """| Adapt the detector to the learned profile of a lamp combination, noise tolerance to the measured noise, and
+        | the learned decay time is used to fit the whole warmup.
+
+        :param profile: learned profile, as returned by WarmupProfiles.get().
+        """
+        if profile.get('plateau', 0) > 0 and not np.isnan(profile.get('noise', np.nan)):
+            self.noiseTolerance = max(self.noiseTolerance, 3 * profile['noise'] / profile['plateau'])
+
+        self.priorTau = profile.get('tau', np.nan)
+
+    def new(self, timestamp, value):
+        """| Add a new sample and update the prediction, nan and already known samples are ignored.
+
+        :param timestamp: sample time in seconds.
+        :param value: flux value.
+        """
+        if np.isnan(value) or (self.timestamps and timestamp <= self.timestamps[-1]):
+            return
+
+        self.timestamps.append(timestamp)
+        self.values.append(value)
+        self.updateLegacy(timestamp, value)
+        self.update()
+
+    def update(self):
+        """Refit the trailing window and recompute the predicted relative drift."""
+        t = np.array(self.timestamps)
+        f = np.array(self.values)
+        windowTime = max(self.minWindow, (t[-1] - t[0]) / 2)
+        inWindow = t >= t[-1] - windowTime
+
+        if inWindow.sum() < self.window:
+            inWindow[-self.window:] = True
+        t, f = t[inWindow], f[inWindow]
+
+        if len(t) < self.window:
+            return
+
+        slope, slopeErr, level, noise = self.fit(t, f)
+        self.level = level
+        self.noise = noise
+
+        if not level > 0:
+            self.drift = np.inf
+            return
+
+        half = len(t) // 2
+        prevSlope, prevSlopeErr = self.fit(t[:half], f[:half])[:2]
+        lastSlope, lastSlopeErr = self.fit(t[half:], f[half:])[:2]
+        dt = t[half:].mean() - t[:half].mean()
+        isSignificant = abs(lastSlope) > 2 * lastSlopeErr and abs(prevSlope) > 2 * prevSlopeErr
+        # slowest decay compatible with both slopes.
+        ratio = (abs(prevSlope) - 2 * prevSlopeErr) / (abs(lastSlope) + 2 * lastSlopeErr)
+
+        self.tau = np.nan
+        if isSignificant and prevSlope * lastSlope > 0 and ratio > 1:
+            self.tau = dt / np.log(ratio)
+            # the window slope averages a decaying one, the last half slope is closer to the current one.
+            slope, slopeErr = lastSlope, lastSlopeErr
+
+        remaining = self.tau if not np.isnan(self.tau) else t[-1] - t[0]
+        self.drift = (abs(slope) + 2 * slopeErr) * min(remaining, self.horizon) / level
+
+        if not np.isnan(self.priorTau):
+            self.drift = min(self.drift, self.priorDrift(noise))
+
+    def priorDrift(self, noise):
+        """| Fit the whole warmup by level + amplitude * exp(-t / priorTau).
+
+        :param noise: residual scatter of the trailing line fit.
+        :return: upper bound of the remaining excursion relative to the current flux, inf if the model does not fit
+                 as well as the trailing line.
+        """
+        t = np.array(self.timestamps)
+        f = np.array(self.values)
+        decay = np.exp(-(t - t[0]) / self.priorTau)
+        model = np.vstack([np.ones(len(t)), decay]).T
+        (level, amplitude), residuals = np.linalg.lstsq(model, f, rcond=None)[:2]
+        modelNoise = np.sqrt(residuals[0] / max(len(f) - 2, 1)) if len(residuals) else np.inf
+        amplitudeErr = np.sqrt(np.linalg.pinv(np.dot(model.T, model))[1, 1]) * modelNoise
+        # remaining excursion and flux at the last sample.
+        excursion = (abs(amplitude) + 2 * amplitudeErr) * decay[-1]
+        current = level + amplitude * decay[-1]
+
+        if not current > 0 or modelNoise > 1.5 * noise:
+            return np.inf
+
+        return excursion / current
+
+    def fitDecayTime(self, taus=np.geomspace(1, 1000, 200)):
+        """| Decay time of the exponential approach best fitting the whole warmup, to be learned by the profiles.
+
+        :param taus: decay times tried, in seconds.
+        :return: decay time in seconds, nan if there are not enough samples or if the flux is not changing.
+        """
+        if self.nSamples < self.window:
+            return np.nan
+
+        t = np.array(self.timestamps)
+        f = np.array(self.values)
+        chi2 = []
+
+        for tau in taus:
+            model = np.vstack([np.ones(len(t)), np.exp(-(t - t[0]) / tau)]).T
+            chi2.append(np.sum((f - np.dot(model, np.linalg.lstsq(model, f, rcond=None)[0])) ** 2))
+
+        best = int(np.argmin(chi2))
+        # a best fit on the edge of the grid is not an exponential approach.
+        return float(taus[best]) if 0 < best < len(taus) - 1 else np.nan
+
+    def fit(self, t, f):
+        """| Linear least-squares fit.
+
+        :return: slope, slope standard error, mean level, residual standard deviation.
+        """
+        t = t - t.mean()
+        level = f.mean()
+        sxx = np.dot(t, t)
+        slope = np.dot(t, f - level) / sxx if sxx > 0 else 0.
+        residuals = f - level - slope * t
+        noise = np.sqrt(np.dot(residuals, residuals) / max(len(f) - 2, 1))
+        slopeErr = noise / np.sqrt(sxx) if sxx > 0 else np.inf
+
+        return slope, slopeErr, level, noise
+
+    def updateLegacy(self, timestamp, value):
+        """| Replay the legacy criterion, readings every legacyPeriod seconds, the flux being stable when legacySamples
+        | readings whose median is above 0.01 and standard deviation below 2% of the median (0.002 at least) are found
+        | among the last legacyCapacity readings younger than legacyOutdated seconds.
+        """
+        if self.isLegacyStable or (self.legacyTimes and timestamp - self.legacyTimes[-1] < self.legacyPeriod):
+            return
+
+        self.legacyTimes.append(timestamp)
+        self.legacyValues.append(value)
+        window = np.array([v for t, v in zip(self.legacyTimes[-self.legacyCapacity:],
+                                             self.legacyValues[-self.legacyCapacity:])
+                           if timestamp - t <= self.legacyOutdated])
+        if len(window) < self.legacySamples:
+            return
+
+        median = np.median(window)
+        if median > 0.01 and window.std() < max(median * 0.02, 0.002):
+            self.legacyAt = timestamp
+
+    def legacyDecision(self):
+        """| Time at which the legacy criterion would have declared the same samples stable, relative to the first one.
+
+        :return: decision time in seconds, nan if legacy had not decided yet.
+        """
+        # legacy sleeps legacyPeriod seconds after each reading before checking.
+        return self.legacyAt + self.legacyPeriod - self.timestamps[0] if self.isLegacyStable else np.nan
+
+    def timeSaved(self, elapsed):
+        """| Time saved compared to the legacy criterion evaluated on the same samples. If legacy had not decided yet,
+        | this is a lower bound, legacy needing at least one more reading.
+
+        :param elapsed: predictive warmup duration in seconds.
+        """
+        if self.isLegacyStable:
+            return self.legacyDecision() - elapsed
+
+        nextDecision = self.legacyTimes[-1] + 2 * self.legacyPeriod - self.timestamps[0] if self.legacyTimes else 0
+        return max(nextDecision - elapsed, 0)
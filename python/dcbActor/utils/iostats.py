@@ -0,0 +1,150 @@
+"""
+Lightweight per-command I/O statistics for the controllers sendOneCommand.
+"""
+
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+
+
+class VerbStats(object):
+    """Latency histogram, error, retry and byte counters for one command verb."""
+    # histogram bin upper edges in seconds, log spaced from 1ms to 100s
+    edges = [10 ** (exp / 4) for exp in range(-12, 9)]
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.retries = 0
+        self.total = 0.
+        self.max = 0.
+        self.bytesOut = 0
+        self.bytesIn = 0
+        self.histogram = [0] * (len(self.edges) + 1)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else float('nan')
+
+    def record(self, elapsed, bytesOut, bytesIn, failed):
+        self.count += 1
+        self.errors += int(failed)
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        self.bytesOut += bytesOut
+        self.bytesIn += bytesIn
+        self.histogram[bisect.bisect_left(self.edges, elapsed)] += 1
+
+    def percentile(self, q):
+        """Upper edge of the histogram bin reaching the q quantile, in seconds."""
+        if not self.count:
+            return float('nan')
+
+        cumulated = 0
+        for i, n in enumerate(self.histogram):
+            cumulated += n
+            if cumulated >= q * self.count:
+                return min(self.edges[i], self.max) if i < len(self.edges) else self.max
+
+    def toDict(self):
+        return dict(count=self.count, errors=self.errors, retries=self.retries, mean=self.mean, max=self.max,
+                    p50=self.percentile(0.5), p90=self.percentile(0.9), bytesOut=self.bytesOut,
+                    bytesIn=self.bytesIn, histogram=list(self.histogram))
+
+
+class IOStats(object):
+    """I/O statistics of one controller, keyed by command verb.
+
+    Parameters
+    ----------
+    name : `str`
+        Controller name.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.verbs = dict()
+        self.since = time.time()
+
+    def call(self, verb, cmdStr, func, *args, **kwargs):
+        """| Call func, which sends cmdStr and returns the reply, and record its latency and size.
+
+        :param verb: command verb statistics are accumulated into.
+        :param cmdStr: command string, for byte counting.
+        :param func: function sending the command.
+        :return: func return value.
+        """
+        start = time.perf_counter()
+        reply = ''
+        failed = True
+        try:
+            reply = func(*args, **kwargs)
+            failed = False
+            return reply
+        finally:
+            self.record(verb, time.perf_counter() - start, len(cmdStr), len(reply) if reply else 0, failed)
+
+    def record(self, verb, elapsed, bytesOut=0, bytesIn=0, failed=False):
+        with self.lock:
+            self.verbs.setdefault(verb, VerbStats()).record(elapsed, bytesOut, bytesIn, failed)
+
+    def retry(self, verb):
+        with self.lock:
+            self.verbs.setdefault(verb, VerbStats()).retries += 1
+
+    def reset(self):
+        with self.lock:
+            self.verbs.clear()
+            self.since = time.time()
+
+    def toDict(self):
+        with self.lock:
+            return dict(controller=self.name, since=self.since,
+                        verbs=dict([(verb, stats.toDict()) for verb, stats in self.verbs.items()]))
+
+    def genKeys(self, cmd):
+        """| Generate one iostats keyword per verb.
+        | iostats=controller,verb,count,errors,retries,meanMs,p50Ms,p90Ms,maxMs,bytesOut,bytesIn
+
+        :param cmd: on going command
+        """
+        for verb, stats in sorted(self.toDict()['verbs'].items()):
+            cmd.inform('iostats=%s,%s,%d,%d,%d,%.1f,%.1f,%.1f,%.1f,%d,%d' % (self.name, verb, stats['count'],
+                                                                           stats['errors'], stats['retries'],
+                                                                           1000 * stats['mean'], 1000 * stats['p50'],
+                                                                           1000 * stats['p90'], 1000 * stats['max'],
+                                                                           stats['bytesOut'], stats['bytesIn']))
+
+
+class IOStatsWriter(threading.Thread):
+    """Append every controller I/O statistics to a daily json lines file in datadir, every period seconds."""
+
+    def __init__(self, actor, datadir, period):
+        threading.Thread.__init__(self, name='iostatsWriter', daemon=True)
+        self.actor = actor
+        self.datadir = datadir
+        self.period = period
+        self.abort = threading.Event()
+        self.logger = logging.getLogger('iostats')
+
+    def run(self):
+        while not self.abort.wait(self.period):
+            try:
+                self.write()
+            except Exception as e:
+                self.logger.warning('failed to write iostats : %s', e)
+
+    def write(self):
+        os.makedirs(self.datadir, exist_ok=True)
+        path = os.path.join(self.datadir, 'iostats-%s.jsonl' % time.strftime('%Y-%m-%d'))
+        now = time.time()
+
+        with open(path, 'a') as statsFile:
+            for controller in list(self.actor.controllers.values()):
+                iostats = getattr(controller, 'iostats', None)
+                if iostats is not None:
+                    statsFile.write('%s\n' % json.dumps(dict(time=now, **iostats.toDict())))
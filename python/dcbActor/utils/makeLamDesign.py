@@ -5,17 +5,20 @@ Executable script to create a PfiDesign for a LAM exposure, given the colors
 of fibers used.
 """
 
+from functools import lru_cache
+
 import numpy as np
 
 # Mapping of colors to fiberIds
 # Constructed from a snippet by Fabrice Madec, "dummy cable B fibers"
 # https://sumire-pfs.slack.com/files/U3MLENNHH/FFS6P4UR5/dummy_cable_b_fibers.txt
 
-allFibers = list(np.arange(1, 652))
+NFIBERS = 651
+allFibers = list(np.arange(1, NFIBERS + 1))
 blank = [44, 91, 93, 136, 183, 185, 228, 272] + list(np.arange(317, 336)) + [383, 427, 470, 472, 516, 559, 561, 608]
 blank34 = [281, 309, 359]
 engineering = [1, 45, 92, 137, 184, 229, 273, 316, 336, 382, 426, 471, 515, 560, 607, 651]
-science = np.array([fib for fib in allFibers if fib not in engineering + blank])
+science = np.setdiff1d(allFibers, engineering + blank)
 mtp9 = list(science[science < 273])
 mtp12 = list(science[science > 273])
 
@@ -34,7 +37,7 @@ FIBER_COLORS = {"red1": [2],
                 "engineering": engineering,
                 "9mtp": mtp9,
                 "12mtpS12": mtp12,
-                "12mtpS34": [fib for fib in mtp12 if fib not in blank34]
+                "12mtpS34": list(np.setdiff1d(mtp12, blank34))
                 }
 
 sortedKeys = ['blue', 'green', 'orange', 'red1', 'red2', 'red3', 'red4', 'red5', 'red6', 'red7', 'red8', 'yellow',
@@ -43,6 +46,13 @@ sortedKeys = ['blue', 'green', 'orange', 'red1', 'red2', 'red3', 'red4', 'red5',
 # This scheme makes the hash look like binary, with a 1 if the color was used and 0 if not
 HASH_COLORS = {color: 16 ** ii for ii, color in enumerate(sortedKeys)}
 
+# Boolean (colors x fibers) matrix, row ii is the fiber mask of sortedKeys[ii]
+COLOR_INDEX = {color: ii for ii, color in enumerate(sortedKeys)}
+COLOR_MASKS = np.zeros((len(sortedKeys), NFIBERS), dtype=bool)
+for color, fibers in FIBER_COLORS.items():
+    COLOR_MASKS[COLOR_INDEX[color], np.array(fibers, dtype=int) - 1] = True
+COLOR_MASKS.flags.writeable = False
+
 
 def colorsToFibers(colors):
     """Convert a list of colors to an array of fiber IDs
@@ -55,7 +65,8 @@ def colorsToFibers(colors):
     fiberId : `numpy.ndarray`
         Array of fiber IDs.
     """
-    return np.array(sorted(set(sum([FIBER_COLORS[col] for col in colors], []))))
+    mask = COLOR_MASKS[[COLOR_INDEX[col] for col in colors]].any(axis=0)
+    return mask.nonzero()[0] + 1
 
 
 def hashColors(colors):
@@ -70,3 +81,82 @@ def hashColors(colors):
         Hash, for the pfiDesignId.
     """
     return sum(HASH_COLORS[col] for col in set(colors))
+
+
+@lru_cache(maxsize=1024)
+def designIdToColors(designId):
+    """Convert a pfiDesignId back to the list of colors it was hashed from
+    Parameters
+    ----------
+    designId : `int`
+        Hash, for the pfiDesignId.
+    Returns
+    -------
+    colors : `tuple` of `str`
+        Colors, in sortedKeys order.
+    """
+    digits = [(designId >> (4 * ii)) & 0xf for ii in range(len(sortedKeys))]
+
+    if designId >> (4 * len(sortedKeys)) or any(digit > 1 for digit in digits):
+        raise ValueError('0x%016x is not a lam pfiDesignId' % designId)
+
+    return tuple(color for color, digit in zip(sortedKeys, digits) if digit)
+
+
+@lru_cache(maxsize=1024)
+def designIdToFibers(designId):
+    """Convert a pfiDesignId to an array of fiber IDs
+    Parameters
+    ----------
+    designId : `int`
+        Hash, for the pfiDesignId.
+    Returns
+    -------
+    fiberId : `numpy.ndarray`
+        Read-only array of fiber IDs.
+    """
+    fiberId = colorsToFibers(designIdToColors(designId))
+    fiberId.flags.writeable = False
+    return fiberId
+
+
+def colorSetsToMasks(colorSets):
+    """Convert many lists of colors to fiber masks at once
+    Parameters
+    ----------
+    colorSets : iterable of iterable of `str`
+        Lists of colors.
+    Returns
+    -------
+    masks : `numpy.ndarray`
+        Boolean array of shape (len(colorSets), NFIBERS), masks[i, fiberId - 1] is True if fiberId is lit.
+    """
+    selection = colorSetsToSelection(colorSets)
+    return np.dot(selection.astype(np.int32), COLOR_MASKS.astype(np.int32)) > 0
+
+
+def hashColorSets(colorSets):
+    """Convert many lists of colors to pfiDesignIds at once
+    Parameters
+    ----------
+    colorSets : iterable of iterable of `str`
+        Lists of colors.
+    Returns
+    -------
+    hashes : `list` of `int`
+        Hash for each list of colors.
+    """
+    selection = colorSetsToSelection(colorSets)
+    weights = [HASH_COLORS[color] for color in sortedKeys]
+    return [sum(weight for weight, selected in zip(weights, row) if selected) for row in selection.tolist()]
+
+
+def colorSetsToSelection(colorSets):
+    """Boolean (colorSets x colors) selection matrix, columns in sortedKeys order."""
+    colorSets = list(colorSets)
+    selection = np.zeros((len(colorSets), len(sortedKeys)), dtype=bool)
+
+    for ii, colors in enumerate(colorSets):
+        selection[ii, [COLOR_INDEX[col] for col in colors]] = True
+
+    return selection
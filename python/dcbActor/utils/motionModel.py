@@ -0,0 +1,100 @@
+"""
+Monochromator motion durations, learned from the measured ones and persisted in datadir.
+"""
+
+import json
+import os
+import tempfile
+import threading
+
+
+class MotionModel(object):
+    """Predict how long a wavelength, grating or outport motion takes.
+
+    Wavelength moves are modelled as overhead + secPerNm * |delta|, fitted by exponentially weighted least squares.
+    Grating changes and outport moves durations are exponential moving averages.
+
+    Parameters
+    ----------
+    path : `str`
+        Json file the model is persisted in, None to keep it in memory only.
+    alpha : `float`
+        Weight of the latest motion.
+    """
+    defaults = dict(overhead=0.5, secPerNm=0.01, grating=6., outport=0.5)
+
+    def __init__(self, path=None, alpha=0.2):
+        self.path = path
+        self.alpha = alpha
+        self.lock = threading.Lock()
+        self.params = dict(self.defaults)
+        # weighted sums of 1, x, y, x*x, x*y for the wavelength fit.
+        self.sums = [0.] * 5
+        self.load()
+
+    def load(self):
+        if self.path is None:
+            return
+        try:
+            with open(self.path) as modelFile:
+                saved = json.load(modelFile)
+        except FileNotFoundError:
+            return
+
+        self.params.update(saved['params'])
+        self.sums = saved['sums']
+
+    def predict(self, motion, delta):
+        """| Expected motion duration in seconds.
+
+        :param motion: wave|grating|outport.
+        :param delta: wavelength change in nm, or whether the grating/outport changes.
+        """
+        with self.lock:
+            if motion == 'wave':
+                return self.params['overhead'] + self.params['secPerNm'] * abs(delta)
+
+            return self.params[motion] if delta else self.params['overhead']
+
+    def update(self, motion, delta, duration):
+        """| Blend a measured motion into the model and persist it.
+
+        :param motion: wave|grating|outport.
+        :param delta: wavelength change in nm, or whether the grating/outport changes.
+        :param duration: measured duration in seconds.
+        """
+        with self.lock:
+            if motion == 'wave':
+                self.fitWave(abs(delta), duration)
+            elif delta:
+                self.params[motion] = (1 - self.alpha) * self.params[motion] + self.alpha * duration
+
+            self.save()
+
+    def fitWave(self, x, y):
+        self.sums = [(1 - self.alpha) * total + self.alpha * new for total, new in
+                     zip(self.sums, [1., x, y, x * x, x * y])]
+        s0, sx, sy, sxx, sxy = self.sums
+        det = s0 * sxx - sx * sx
+
+        # keep the current slope until moves of different amplitudes have been seen.
+        if det > 1e-6 * max(s0 * sxx, 1e-12):
+            self.params['secPerNm'] = max((s0 * sxy - sx * sy) / det, 0.)
+
+        self.params['overhead'] = max((sy - self.params['secPerNm'] * sx) / s0, 0.)
+
+    def save(self):
+        """Write the model to a temporary file then rename it, so a crash never leaves a truncated file."""
+        if self.path is None:
+            return
+
+        dirname = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(dirname, exist_ok=True)
+        fd, tmpPath = tempfile.mkstemp(prefix='.monoMotion.', dir=dirname)
+        try:
+            with os.fdopen(fd, 'w') as tmpFile:
+                json.dump(dict(params=self.params, sums=self.sums), tmpFile, indent=2, sort_keys=True)
+            os.replace(tmpPath, self.path)
+        except Exception:
+            os.unlink(tmpPath)
+            raise
@@ -0,0 +1,138 @@
+"""
+Minimal dependency-graph executor, used to run independent hardware actions concurrently.
+"""
+
+import threading
+from collections import OrderedDict
+
+from dcbActor.utils.clock import realClock
+
+
+class Step(object):
+    """One action of a plan."""
+
+    def __init__(self, name, func, args, kwargs, requires, resource, estimate):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.requires = list(requires)
+        self.resource = resource
+        self.estimate = estimate
+
+        self.done = threading.Event()
+        self.start = None
+        self.end = None
+        self.error = None
+        self.skipped = False
+
+    @property
+    def duration(self):
+        return self.end - self.start if self.start is not None and self.end is not None else 0.
+
+
+class Planner(object):
+    """Run steps as soon as their requirements are completed.
+
+    Steps sharing the same resource are run one after the other, in the order they were added, so that a device is
+    never driven by two steps at once. If a step fails, the steps depending on it are skipped and the first error is
+    raised once every running step has returned.
+
+    Parameters
+    ----------
+    clock : `dcbActor.utils.clock.Clock`
+        Time base used to time the steps.
+    """
+
+    def __init__(self, clock=realClock):
+        self.clock = clock
+        self.steps = OrderedDict()
+
+    def __bool__(self):
+        return bool(self.steps)
+
+    def add(self, name, func, *args, requires=(), resource=None, estimate=0., **kwargs):
+        """| Add a step calling func(*args, **kwargs).
+
+        :param name: unique step name.
+        :param requires: names of the steps which need to be completed first.
+        :param resource: steps sharing the same resource are serialised.
+        :param estimate: expected duration in seconds, used for the planned critical path.
+        :raise: KeyError if the name is already used or if a required step is unknown.
+        """
+        # steps can only require steps added before them, which rules out dependency cycles.
+        if name in self.steps:
+            raise KeyError('step %s already exists' % name)
+
+        requires = list(requires)
+        if resource is not None:
+            previous = [step.name for step in self.steps.values() if step.resource == resource]
+            requires += previous[-1:]
+
+        for required in requires:
+            if required not in self.steps:
+                raise KeyError('%s requires unknown step %s' % (name, required))
+
+        self.steps[name] = Step(name, func, args, kwargs, requires, resource, estimate)
+
+    def run(self):
+        """Run all steps, return once all of them are completed, failed or skipped."""
+        threads = [threading.Thread(target=self.runStep, args=(step,), name=step.name, daemon=True)
+                   for step in self.steps.values()]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        for step in self.steps.values():
+            if step.error is not None:
+                raise step.error
+
+    def runStep(self, step):
+        try:
+            for required in step.requires:
+                self.steps[required].done.wait()
+
+            if any([self.steps[required].error is not None or self.steps[required].skipped
+                    for required in step.requires]):
+                step.skipped = True
+                return
+
+            step.start = self.clock.time()
+            try:
+                step.func(*step.args, **step.kwargs)
+            except BaseException as e:
+                step.error = e
+            finally:
+                step.end = self.clock.time()
+        finally:
+            step.done.set()
+
+    def criticalPath(self, planned=True):
+        """| Longest chain of dependent steps.
+
+        :param planned: use estimated durations if True, measured ones otherwise.
+        :return: list of step names, total duration.
+        """
+        durations = dict([(step.name, step.estimate if planned else step.duration) for step in self.steps.values()])
+        finish = dict()
+        previous = dict()
+
+        for step in self.steps.values():
+            before = max(step.requires, key=lambda required: finish[required], default=None)
+            previous[step.name] = before
+            finish[step.name] = durations[step.name] + (finish[before] if before is not None else 0)
+
+        if not finish:
+            return [], 0.
+
+        name = max(finish, key=lambda name: finish[name])
+        total = finish[name]
+        path = []
+        while name is not None:
+            path.insert(0, name)
+            name = previous[name]
+
+        return path, total
@@ -0,0 +1,147 @@
+"""
+Deadband and rate limited keyword publishing, for values sampled much more often than they change.
+"""
+
+import functools
+import threading
+import time
+
+
+class Policy(object):
+    """Publishing policy of one keyword.
+
+    Parameters
+    ----------
+    deadband : `float`
+        Minimum change of any value to publish it again.
+    relative : `bool`
+        deadband is a fraction of the last published value.
+    maxRate : `float`
+        Maximum publishing rate in Hz, 0 for unlimited.
+    """
+
+    def __init__(self, deadband=0., relative=False, maxRate=0.):
+        self.deadband = deadband
+        self.relative = relative
+        self.minInterval = 1. / maxRate if maxRate > 0 else 0.
+
+    @classmethod
+    def fromString(cls, policyStr):
+        """| Parse a config policy, deadband and max rate, eg 0.002,1 or 1%,0.5
+
+        :param policyStr: deadband, absolute or relative if % is appended, then rate in Hz.
+        """
+        deadband, maxRate = [field.strip() for field in policyStr.split(',')]
+        relative = deadband.endswith('%')
+        deadband = float(deadband[:-1]) / 100 if relative else float(deadband)
+        return cls(deadband=deadband, relative=relative, maxRate=float(maxRate))
+
+    def hasChanged(self, values, published):
+        for value, last in zip(values, published):
+            # nan != nan, a value staying nan is unchanged, but turning nan or back is always a change.
+            isNan, wasNan = value != value, last != last
+            if isNan or wasNan:
+                if isNan != wasNan:
+                    return True
+                continue
+
+            threshold = self.deadband * abs(last) if self.relative else self.deadband
+            if abs(value - last) > threshold:
+                return True
+
+        return False
+
+
+class Publisher(object):
+    """Publish keywords through cmd.inform, suppressing values within their deadband or above their max rate.
+
+    The latest suppressed message of each keyword is kept, and sent by flush(), which is called on state transitions
+    and when the status is generated at command finish. Keywords without policy are always published.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.policies = dict()
+        self.published = dict()
+        self.pending = dict()
+        self.suppressed = dict()
+
+    def configure(self, config, section='publish'):
+        """Load keywords policies from a config section, keyword = deadband,maxRate."""
+        if not config.has_section(section):
+            return
+
+        # options are lower cased by configparser, so keywords are matched case insensitively.
+        # raw, since % marks relative deadbands.
+        self.policies = dict([(keyword.lower(), Policy.fromString(policyStr)) for keyword, policyStr in
+                              config.items(section, raw=True)])
+
+    def inform(self, cmd, keyword, fmt, *values):
+        """| Publish keyword=fmt % values, unless it is suppressed by the keyword policy.
+
+        :param cmd: on going command
+        :param keyword: keyword name.
+        :param fmt: values format.
+        :param values: keyword values, compared to the last published ones.
+        """
+        response = '%s=%s' % (keyword, fmt % values)
+        policy = self.policies.get(keyword.lower())
+        now = time.time()
+
+        with self.lock:
+            if policy is not None and keyword in self.published:
+                published, publishedAt = self.published[keyword]
+                if not policy.hasChanged(values, published):
+                    self.suppress(keyword, None)
+                    return
+                if now - publishedAt < policy.minInterval:
+                    self.suppress(keyword, response)
+                    return
+
+            self.published[keyword] = values, now
+            self.pending.pop(keyword, None)
+
+        cmd.inform(response)
+
+    def suppress(self, keyword, response):
+        self.suppressed[keyword] = self.suppressed.get(keyword, 0) + 1
+        if response is None:
+            # back within the deadband of the published value, nothing left to send.
+            self.pending.pop(keyword, None)
+        else:
+            self.pending[keyword] = response
+
+    def flush(self, cmd):
+        """Send the latest suppressed message of each keyword, and forget published values."""
+        with self.lock:
+            pending = list(self.pending.values())
+            self.pending.clear()
+            self.published.clear()
+
+        for response in pending:
+            cmd.inform(response)
+
+    def flushing(self, func):
+        """Wrap a state callback, flushing once it has returned."""
+
+        @functools.wraps(func)
+        def wrapper(cmd, *args, **kwargs):
+            try:
+                return func(cmd, *args, **kwargs)
+            finally:
+                self.flush(cmd)
+
+        return wrapper
+
+    def genKeys(self, cmd, name):
+        """| Generate suppressed messages count per keyword.
+        | publishSuppressed=controller,keyword,count
+
+        :param cmd: on going command
+        :param name: controller name.
+        """
+        with self.lock:
+            suppressed = sorted(self.suppressed.items())
+
+        for keyword, count in suppressed:
+            cmd.inform('publishSuppressed=%s,%s,%d' % (name, keyword, count))
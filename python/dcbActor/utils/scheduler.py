@@ -0,0 +1,156 @@
+"""
+Central monitor scheduler, replacing the independent per controller monitor timeouts.
+"""
+
+import logging
+import math
+import random
+import threading
+import time
+
+
+class MonitorStats(object):
+    """Monitor period and tick counters of one controller."""
+
+    def __init__(self, period):
+        self.period = period
+        self.controller = None
+        self.nextTick = None
+        self.pending = False
+        self.polledAt = 0
+        self.scheduled = 0
+        self.skippedBusy = 0
+        self.skippedFresh = 0
+        self.late = 0
+
+
+class MonitorScheduler(threading.Thread):
+    """Generate controllers status at a fixed period, ticks being aligned on multiples of the period.
+
+    A tick is skipped if the controller is not ONLINE and IDLE, if its previous status is still pending, or if it has
+    already produced data (lastData attribute) within the period. Controllers monitor periods are adopted and zeroed,
+    so that their own thread timeout does not poll them as well.
+
+    Parameters
+    ----------
+    actor : `dcbActor.main.DcbActor`
+        Actor whose controllers are monitored.
+    jitter : `float`
+        Max random delay in seconds added to every tick, so that devices are not all polled at the same instant.
+    """
+
+    def __init__(self, actor, jitter=1.):
+        threading.Thread.__init__(self, name='monitorScheduler', daemon=True)
+        self.actor = actor
+        self.jitter = jitter
+        self.lock = threading.Lock()
+        self.stats = dict()
+        self.abort = threading.Event()
+        self.logger = logging.getLogger('scheduler')
+
+    def setPeriod(self, name, period):
+        """| Set a controller monitor period, 0 to stop monitoring it.
+
+        :param name: controller name.
+        :param period: period in seconds.
+        """
+        with self.lock:
+            stats = self.stats.setdefault(name, MonitorStats(period))
+            stats.period = period
+            stats.nextTick = self.alignedTick(period) if period > 0 else None
+
+    def period(self, name):
+        """Controller monitor period in seconds, 0 if it is not monitored."""
+        with self.lock:
+            stats = self.stats.get(name)
+            return stats.period if stats is not None else 0
+
+    def alignedTick(self, period, now=None):
+        """Next multiple of period, plus jitter."""
+        now = time.time() if now is None else now
+        return math.floor(now / period + 1) * period + random.uniform(0, self.jitter)
+
+    def adopt(self):
+        """Take over the monitor period of newly connected controllers, resetting the stats of reconnected ones."""
+        for name, controller in list(self.actor.controllers.items()):
+            period = getattr(controller, 'monitor', 0)
+            if period:
+                controller.monitor = 0
+                self.setPeriod(name, period)
+
+            with self.lock:
+                stats = self.stats.get(name)
+                if stats is None or stats.controller is controller:
+                    continue
+
+                # a status queued to the previous controller object will never complete.
+                if stats.controller is not None:
+                    self.stats[name] = stats = MonitorStats(stats.period)
+                    stats.nextTick = self.alignedTick(stats.period) if stats.period > 0 else None
+
+                stats.controller = controller
+
+    def run(self):
+        while not self.abort.is_set():
+            try:
+                self.adopt()
+                self.tick()
+            except Exception as e:
+                self.logger.warning('monitor scheduler : %s', e)
+
+            with self.lock:
+                ticks = [stats.nextTick for stats in self.stats.values() if stats.nextTick is not None]
+
+            self.abort.wait(min([1.] + [tick - time.time() for tick in ticks]))
+
+    def tick(self):
+        """Dispatch every due tick."""
+        now = time.time()
+
+        with self.lock:
+            due = [(name, stats) for name, stats in self.stats.items()
+                   if stats.nextTick is not None and stats.nextTick <= now]
+
+            for name, stats in due:
+                scheduled = stats.nextTick
+                stats.nextTick = self.alignedTick(stats.period, now=now)
+                controller = self.actor.controllers.get(name)
+
+                if controller is None or stats.pending or controller.states.current != 'ONLINE' or \
+                        controller.substates.current != 'IDLE':
+                    stats.skippedBusy += 1
+                    continue
+
+                # data generated by the scheduler own poll does not count, only status or motions from commands.
+                lastData = getattr(controller, 'lastData', 0)
+                if lastData > stats.polledAt and now - lastData < stats.period:
+                    stats.skippedFresh += 1
+                    continue
+
+                stats.scheduled += 1
+                stats.pending = True
+                controller.putMsg(self.generate, controller, stats, scheduled)
+
+    def generate(self, controller, stats, scheduled):
+        """Controller status and states, called from the controller thread, as its own monitor would."""
+        try:
+            if time.time() - scheduled > stats.period / 2:
+                stats.late += 1
+
+            controller.generate(self.actor.bcast)
+        except Exception as e:
+            self.actor.bcast.warn('text=%s' % self.actor.strTraceback(e))
+        finally:
+            stats.polledAt = time.time()
+            stats.pending = False
+
+    def genKeys(self, cmd):
+        """| Generate one keyword per monitored controller.
+        | monitorStats=controller,period,scheduled,skippedBusy,skippedFresh,late
+
+        :param cmd: on going command
+        """
+        with self.lock:
+            for name, stats in sorted(self.stats.items()):
+                cmd.inform('monitorStats=%s,%g,%d,%d,%d,%d' % (name, stats.period, stats.scheduled, stats.skippedBusy,
+                                                              stats.skippedFresh, stats.late))
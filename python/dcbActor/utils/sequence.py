@@ -0,0 +1,218 @@
+"""
+Compact calibration sequences, validated up front then run step by step inside the actor.
+
+Steps are separated by newlines or semicolons, # starts a comment::
+
+    arc on=neon,hgar attenuator=100
+    mono set wave=550; mono shutter open
+    wait 5
+    monoqth off
+"""
+
+import shlex
+
+from dcbActor.utils import controllerThread
+from dcbActor.utils.clock import realClock
+
+
+def controller(actor, name):
+    try:
+        return actor.controllers[name]
+    except KeyError:
+        raise RuntimeError('%s controller is not connected.' % name)
+
+
+def arc(actor, cmd, on=(), off=(), attenuator=None, force=False):
+    controller(actor, 'labsphere').switchArcs(cmd, arcOn=on, arcOff=off, attenuator=attenuator, force=force)
+
+
+def attenuator(actor, cmd, value):
+    labsphere = controller(actor, 'labsphere')
+    if value != labsphere.attenuator:
+        labsphere.substates.move(cmd, value)
+
+
+def flux(actor, cmd, target):
+    labsphere = controller(actor, 'labsphere')
+    value = labsphere.fluxToAttenuator(cmd, target=target)
+    if value != labsphere.attenuator:
+        labsphere.substates.move(cmd, value)
+
+
+def halogen(actor, cmd, state):
+    controller(actor, 'labsphere').substates.halogen(cmd, state)
+
+
+def setWave(actor, cmd, wavelength):
+    controller(actor, 'mono').substates.setwave(cmd, wavelength)
+
+
+def setGrating(actor, cmd, gratingId):
+    controller(actor, 'mono').substates.setgrating(cmd, gratingId)
+
+
+def setOutport(actor, cmd, outportId):
+    controller(actor, 'mono').substates.setoutport(cmd, outportId)
+
+
+def shutter(actor, cmd, state):
+    mono = controller(actor, 'mono')
+    if state == 'open':
+        mono.substates.openshutter(cmd)
+    else:
+        mono.substates.closeshutter(cmd)
+
+
+def qth(actor, cmd, state):
+    monoqth = controller(actor, 'monoqth')
+    if state == 'on':
+        monoqth.substates.turnon(cmd)
+    else:
+        monoqth.substates.turnoff(cmd)
+
+
+class Step(object):
+    """One parsed sequence step, run in the thread of its first controller so that it never shares the line with
+    that controller status or monitor."""
+
+    def __init__(self, text, controllers, func, **kwargs):
+        self.text = text
+        self.controllers = controllers
+        self.func = func
+        self.kwargs = kwargs
+
+    def __call__(self, actor, cmd, clock=realClock):
+        if self.func is None:
+            clock.sleep(self.kwargs['seconds'])
+        else:
+            controllerThread.execute(controller(actor, self.controllers[0]), self.func, actor, cmd, **self.kwargs)
+
+
+def splitKeywords(words):
+    """Return dict of key=value words, bare words are mapped to None."""
+    keywords = dict()
+    for word in words:
+        key, sep, value = word.partition('=')
+        keywords[key] = value if sep else None
+    return keywords
+
+
+def parseStep(text):
+    """| Parse one step, using the same syntax as the matching actor command.
+
+    :param text: step string.
+    :return: Step
+    :raise: ValueError if the step is not understood.
+    """
+    words = shlex.split(text)
+    verb, args = words[0], words[1:]
+    keywords = splitKeywords(args)
+
+    try:
+        if verb == 'wait' and len(args) == 1:
+            seconds = float(args[0])
+            if seconds < 0:
+                raise ValueError('wait duration must be positive')
+            return Step(text, [], None, seconds=seconds)
+
+        if verb == 'arc' and args and set(keywords) <= {'on', 'off', 'attenuator', 'force'}:
+            if None in [keywords.get(key, '') for key in ['on', 'off', 'attenuator']]:
+                raise ValueError('on, off and attenuator need a value')
+            return Step(text, ['labsphere', 'aten'], arc,
+                        on=keywords['on'].split(',') if 'on' in keywords else [],
+                        off=keywords['off'].split(',') if 'off' in keywords else [],
+                        attenuator=int(keywords['attenuator']) if 'attenuator' in keywords else None,
+                        force='force' in keywords)
+
+        if verb == 'labsphere':
+            if list(keywords) == ['attenuator'] and keywords['attenuator'] is not None:
+                return Step(text, ['labsphere'], attenuator, value=int(keywords['attenuator']))
+            if list(keywords) == ['fluxTarget'] and keywords['fluxTarget'] is not None:
+                return Step(text, ['labsphere'], flux, target=float(keywords['fluxTarget']))
+            if args in [['halogen', 'on'], ['halogen', 'off']]:
+                return Step(text, ['labsphere'], halogen, state=args[1])
+
+        if verb == 'mono':
+            if len(args) == 2 and args[0] == 'set':
+                key, value = args[1].split('=')
+                if key == 'wave':
+                    return Step(text, ['mono'], setWave, wavelength=float(value))
+                if key == 'grating':
+                    return Step(text, ['mono'], setGrating, gratingId=int(value))
+                if key == 'outport':
+                    return Step(text, ['mono'], setOutport, outportId=int(value))
+            if args in [['shutter', 'open'], ['shutter', 'close']]:
+                return Step(text, ['mono'], shutter, state=args[1])
+
+        if verb == 'monoqth' and args in [['on'], ['off']]:
+            return Step(text, ['monoqth'], qth, state=args[0])
+
+    except ValueError as e:
+        raise ValueError('invalid step "%s" : %s' % (text, e))
+
+    raise ValueError('unknown step "%s"' % text)
+
+
+def parse(text):
+    """| Parse a whole sequence.
+
+    :param text: steps separated by newlines or semicolons.
+    :return: list of Step.
+    :raise: ValueError on the first invalid step, with its line number.
+    """
+    steps = []
+    for lineNb, line in enumerate(text.splitlines(), start=1):
+        for stepStr in line.split('#')[0].split(';'):
+            if not stepStr.strip():
+                continue
+            try:
+                steps.append(parseStep(stepStr.strip()))
+            except ValueError as e:
+                raise ValueError('line %d : %s' % (lineNb, e))
+
+    if not steps:
+        raise ValueError('empty sequence')
+
+    return steps
+
+
+def validate(actor, steps):
+    """| Check that every controller required by the sequence is connected, every lamp is known, attenuator values
+    | are within range and every flux step has an attenuator calibration for the lamps on at that point.
+
+    :raise: RuntimeError, KeyError, ValueError
+    """
+    for name in sorted(set(sum([step.controllers for step in steps], []))):
+        controller(actor, name)
+
+    fluxSteps = [step for step in steps if step.func is flux]
+    try:
+        arcs = dict(actor.arcs)
+    except KeyError:
+        if fluxSteps:
+            raise RuntimeError('lamps state is unknown, flux steps cannot be checked.')
+        arcs = None
+
+    for step in steps:
+        if step.func is arc:
+            for lamp in step.kwargs['on'] + step.kwargs['off']:
+                if lamp not in actor.arcs.keys():
+                    raise KeyError('%s is unknown' % lamp)
+
+        value = step.kwargs.get('attenuator') if step.func is arc else step.kwargs.get('value')
+        if step.func in [arc, attenuator] and value is not None and not 0 <= value <= 255:
+            raise ValueError('"%s" : attenuator must be within 0-255' % step.text)
+
+        if arcs is None:
+            continue
+
+        # follow lamps state through the sequence, so that flux steps are checked against the lamps on at that point.
+        if step.func is arc:
+            arcs.update(dict([(lamp, 'on') for lamp in step.kwargs['on']] +
+                             [(lamp, 'off') for lamp in step.kwargs['off']]))
+        elif step.func is halogen:
+            arcs['halogen'] = step.kwargs['state']
+        elif step.func is flux:
+            combination = actor.combinationOf(arcs)
+            if controller(actor, 'labsphere').calibration.get(combination) is None:
+                raise RuntimeError('"%s" : %s attenuator has not been calibrated' % (step.text, combination))
@@ -0,0 +1,83 @@
+"""
+Labsphere attenuator settle times, measured by the converge move mode and persisted in datadir.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+class SettleHistory(object):
+    """Last measured attenuator settle times, used to tighten the converge mode timeout.
+
+    Each move is stored as its settle time relative to the fixed move time formula. The timeout is that formula scaled
+    by the largest ratio measured, with some margin, so a single slow or timed out move restores a looser timeout.
+
+    Parameters
+    ----------
+    path : `str`
+        Json file the history is persisted in, None to keep it in memory only.
+    maxlen : `int`
+        Number of moves kept.
+    """
+
+    def __init__(self, path=None, maxlen=200):
+        self.path = path
+        self.maxlen = maxlen
+        self.lock = threading.Lock()
+        self.moves = self.load()
+
+    def load(self):
+        if self.path is None:
+            return []
+        try:
+            with open(self.path) as historyFile:
+                return json.load(historyFile)[-self.maxlen:]
+        except FileNotFoundError:
+            return []
+
+    def add(self, delta, elapsed, fixedTime, status):
+        """| Record a move and persist the history.
+
+        :param delta: attenuator move amplitude.
+        :param elapsed: measured settle time in seconds.
+        :param fixedTime: fixed move time formula in seconds.
+        :param status: settled|timeout|dark, dark moves cannot be observed and are not used.
+        """
+        with self.lock:
+            self.moves.append(dict(delta=delta, elapsed=round(elapsed, 3), fixedTime=round(fixedTime, 3),
+                                   status=status, time=time.time()))
+            self.moves = self.moves[-self.maxlen:]
+            self.save()
+
+    def timeoutScale(self, minMoves=10, margin=1.5):
+        """| Fraction of the fixed move time to use as timeout, 1 until minMoves moves have been observed.
+
+        :return: scale, number of moves it is derived from.
+        """
+        with self.lock:
+            ratios = [move['elapsed'] / move['fixedTime'] for move in self.moves
+                      if move['status'] != 'dark' and move['fixedTime'] > 0]
+
+        if len(ratios) < minMoves:
+            return 1., len(ratios)
+
+        return min(margin * max(ratios), 1.), len(ratios)
+
+    def save(self):
+        """Write the history to a temporary file then rename it, so a crash never leaves a truncated file."""
+        if self.path is None:
+            return
+
+        dirname = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(dirname, exist_ok=True)
+        fd, tmpPath = tempfile.mkstemp(prefix='.attenuatorSettle.', dir=dirname)
+        try:
+            with os.fdopen(fd, 'w') as tmpFile:
+                json.dump(self.moves, tmpFile)
+            os.replace(tmpPath, self.path)
+        except Exception:
+            os.unlink(tmpPath)
+            raise
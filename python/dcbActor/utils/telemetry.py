@@ -0,0 +1,210 @@
+"""
+Append-only flux and power telemetry, stored as fixed-width binary records in daily files under datadir.
+
+Each file starts with a fixed size header holding the number of committed records, followed by packed
+(time, source, value) records. Files are preallocated by blocks so that appending does not grow them on every
+record, and the header count is only updated once a record is written, so readers never see partial records.
+
+    >>> telemetry = TelemetryReader(datadir)
+    >>> data = telemetry.load('2024-05-12', source='labsphere.photodiode', start=t0, end=t1)
+    >>> data['time'], data['value']
+"""
+
+import logging
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+magic = b'DCBTLM01'
+headerFormat = '<8sIQ'
+headerSize = 64
+recordDtype = np.dtype([('time', '<f8'), ('source', '<u2'), ('value', '<f8')])
+
+# source ids are written to disk, never renumber them, only append new ones.
+sources = {'labsphere.photodiode': 1,
+           'monoqth.volts': 2,
+           'monoqth.amps': 3,
+           'monoqth.watts': 4,
+           'aten.volts': 5,
+           'aten.amps': 6,
+           'aten.watts': 7,
+           }
+sourceNames = dict([(sourceId, name) for name, sourceId in sources.items()])
+
+
+def dayOf(timestamp):
+    return time.strftime('%Y-%m-%d', time.localtime(timestamp))
+
+
+def filename(datadir, day):
+    return os.path.join(datadir, 'telemetry', 'telemetry-%s.bin' % day)
+
+
+class TelemetryWriter(object):
+    """Append telemetry records to the current daily file, switching to a new file when the day changes.
+
+    Parameters
+    ----------
+    datadir : `str`
+        Root data directory, files are written to datadir/telemetry.
+    blockSize : `int`
+        Number of records preallocated at once.
+    """
+
+    def __init__(self, datadir, blockSize=65536):
+        self.datadir = datadir
+        self.blockSize = blockSize
+        self.lock = threading.Lock()
+        self.fd = None
+        self.day = None
+        self.count = 0
+        self.allocated = 0
+        self.logger = logging.getLogger('telemetry')
+
+    def open(self, day):
+        """Open or create the file of a given day and read its committed record count."""
+        path = filename(self.datadir, day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+
+        header = os.pread(fd, headerSize, 0)
+        if len(header) < headerSize:
+            count = 0
+            os.pwrite(fd, struct.pack(headerFormat, magic, recordDtype.itemsize, 0).ljust(headerSize, b'\0'), 0)
+        else:
+            fileMagic, itemsize, count = struct.unpack_from(headerFormat, header)
+            if fileMagic != magic or itemsize != recordDtype.itemsize:
+                os.close(fd)
+                raise ValueError('%s is not a telemetry file' % path)
+
+        self.fd = fd
+        self.day = day
+        self.count = count
+        self.allocated = (os.fstat(fd).st_size - headerSize) // recordDtype.itemsize
+
+    def close(self):
+        """Trim preallocated space and close the current file, the next record reopens it."""
+        with self.lock:
+            self.closeFile()
+
+    def closeFile(self):
+        if self.fd is None:
+            return
+
+        os.ftruncate(self.fd, headerSize + self.count * recordDtype.itemsize)
+        os.close(self.fd)
+        self.fd = None
+        self.day = None
+
+    def record(self, source, value, timestamp=None):
+        """| Append one value, telemetry failures are logged but never raised.
+
+        :param source: source name, see sources.
+        :param value: value to store, anything float() can convert.
+        :param timestamp: unix time, now if None.
+        """
+        self.recordMany([(source, value)], timestamp=timestamp)
+
+    def recordMany(self, values, timestamp=None):
+        """| Append several (source, value) sharing the same timestamp in a single write. Values which cannot be
+        | converted are logged and skipped, the others are still written.
+
+        :param values: list of (source, value).
+        :param timestamp: unix time, now if None.
+        """
+        converted = []
+        for source, value in values:
+            try:
+                converted.append((sources[source], float(value)))
+            except Exception as e:
+                self.logger.warning('failed to record %s=%r telemetry : %s', source, value, e)
+
+        if not converted:
+            return
+
+        try:
+            with self.lock:
+                # stamped under the lock so that concurrent writers still append in time order.
+                timestamp = time.time() if timestamp is None else timestamp
+                self.append(np.array([(timestamp, sourceId, value) for sourceId, value in converted],
+                                     dtype=recordDtype))
+        except Exception as e:
+            self.logger.warning('failed to record telemetry : %s', e)
+
+    def append(self, records):
+        day = dayOf(records['time'][0])
+        if day != self.day:
+            self.closeFile()
+            self.open(day)
+
+        if self.count + len(records) > self.allocated:
+            self.allocated += max(self.blockSize, len(records))
+            os.ftruncate(self.fd, headerSize + self.allocated * recordDtype.itemsize)
+
+        os.pwrite(self.fd, records.tobytes(), headerSize + self.count * recordDtype.itemsize)
+        self.count += len(records)
+        os.pwrite(self.fd, struct.pack(headerFormat, magic, recordDtype.itemsize, self.count), 0)
+
+
+class TelemetryReader(object):
+    """Expose daily telemetry files as read-only memory maps.
+
+    Parameters
+    ----------
+    datadir : `str`
+        Root data directory, files are read from datadir/telemetry.
+    """
+
+    def __init__(self, datadir):
+        self.datadir = datadir
+
+    def days(self):
+        """Days for which a telemetry file exists."""
+        try:
+            files = os.listdir(os.path.join(self.datadir, 'telemetry'))
+        except FileNotFoundError:
+            return []
+
+        return sorted([name[10:-4] for name in files if name.startswith('telemetry-') and name.endswith('.bin')])
+
+    def memmap(self, day):
+        """| Committed records of a day, zero-copy.
+
+        :param day: YYYY-MM-DD.
+        :return: read-only structured array with time, source and value fields.
+        """
+        path = filename(self.datadir, day)
+        with open(path, 'rb') as telemetryFile:
+            fileMagic, itemsize, count = struct.unpack_from(headerFormat, telemetryFile.read(headerSize))
+
+        if fileMagic != magic or itemsize != recordDtype.itemsize:
+            raise ValueError('%s is not a telemetry file' % path)
+
+        if not count:
+            return np.zeros(0, dtype=recordDtype)
+
+        return np.memmap(path, dtype=recordDtype, mode='r', offset=headerSize, shape=(count,))
+
+    def load(self, day, source=None, start=None, end=None):
+        """| Records of a day in [start, end), optionally from a single source.
+        | Records are appended in time order, so the time range is a zero-copy slice of the memory map, only source
+        | selection makes a copy.
+
+        :param day: YYYY-MM-DD.
+        :param source: source name, all sources if None.
+        :param start: unix time, from the beginning of the file if None.
+        :param end: unix time, up to the end of the file if None.
+        :return: structured array with time, source and value fields.
+        """
+        data = self.memmap(day)
+        first = np.searchsorted(data['time'], start, side='left') if start is not None else 0
+        last = np.searchsorted(data['time'], end, side='left') if end is not None else len(data)
+        data = data[first:last]
+
+        if source is not None:
+            data = data[data['source'] == sources[source]]
+
+        return data
@@ -0,0 +1,98 @@
+"""
+Per lamp combination warmup profiles, learned from previous warmups and persisted in datadir.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+
+class WarmupProfiles(object):
+    """Time to stable, plateau flux, noise level and decay time per lamp combination.
+
+    Each new warmup is blended into the profile with an exponential moving average, and its photodiode time series is
+    saved next to the profile file.
+
+    Parameters
+    ----------
+    path : `str`
+        Json file the profiles are persisted in.
+    alpha : `float`
+        Weight of the latest warmup in the moving average.
+    """
+
+    def __init__(self, path, alpha=0.3):
+        self.path = path
+        self.alpha = alpha
+        self.lock = threading.Lock()
+        self.profiles = self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as profileFile:
+                return json.load(profileFile)
+        except FileNotFoundError:
+            return dict()
+
+    def get(self, combination):
+        """Profile of a lamp combination, None if it has never been warmed up."""
+        with self.lock:
+            profile = self.profiles.get(combination)
+            return dict(profile) if profile is not None else None
+
+    def update(self, combination, timeToStable=np.nan, plateau=np.nan, noise=np.nan, tau=np.nan):
+        """| Blend a new warmup into the combination profile and persist all profiles, nan values are not measured and
+        | leave the profile unchanged, so timed out warmups still teach their decay time.
+
+        :param combination: lamp combination.
+        :param timeToStable: warmup duration in seconds.
+        :param plateau: flux once stable.
+        :param noise: flux standard deviation once stable.
+        :param tau: warmup decay time in seconds.
+        :return: updated profile.
+        """
+        new = dict([(key, float(value)) for key, value in dict(timeToStable=timeToStable, plateau=plateau,
+                                                                noise=noise, tau=tau).items() if not np.isnan(value)])
+
+        with self.lock:
+            profile = self.profiles.get(combination, dict(nWarmups=0))
+            for key, value in new.items():
+                profile[key] = (1 - self.alpha) * profile[key] + self.alpha * value if key in profile else value
+
+            profile['nWarmups'] += 1
+            profile['updated'] = time.time()
+            self.profiles[combination] = profile
+            self.save()
+
+            return dict(profile)
+
+    def save(self):
+        """Write profiles to a temporary file then rename it, so a crash never leaves a truncated file."""
+        dirname = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(dirname, exist_ok=True)
+        fd, tmpPath = tempfile.mkstemp(prefix='.warmupProfiles.', dir=dirname)
+        try:
+            with os.fdopen(fd, 'w') as tmpFile:
+                json.dump(self.profiles, tmpFile, indent=2, sort_keys=True)
+            os.replace(tmpPath, self.path)
+        except Exception:
+            os.unlink(tmpPath)
+            raise
+
+    def saveSeries(self, combination, timestamps, values):
+        """| Save a warmup photodiode time series as a (2, N) array, relative time and flux.
+
+        :return: path of the saved file.
+        """
+        timestamps = np.array(timestamps, dtype=float)
+        series = np.array([timestamps - (timestamps[0] if len(timestamps) else 0), values], dtype=float)
+        dirname = os.path.join(os.path.dirname(os.path.abspath(self.path)), 'warmups')
+        os.makedirs(dirname, exist_ok=True)
+
+        path = os.path.join(dirname, 'warmup-%s-%s.npy' % (time.strftime('%Y%m%dT%H%M%S'), combination))
+        np.save(path, series)
+        return path
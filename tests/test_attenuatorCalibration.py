@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from dcbActor.utils.attenuatorCalibration import AttenuatorCalibration
+
+
+def transmission(setting):
+    """Attenuator transfer function, full flux at 0 and dark at 255."""
+    return (1 - np.asarray(setting) / 255) ** 2
+
+
+@pytest.fixture
+def calibration(tmp_path):
+    calibration = AttenuatorCalibration(str(tmp_path / 'attenuatorCalibration.json'))
+    settings = list(range(0, 255, 16)) + [255]
+    calibration.update('halogen', settings[::-1], 3.2 * transmission(settings[::-1]))
+    return calibration
+
+
+def test_interpolation(calibration):
+    table = calibration.get('halogen')
+    lut = np.array(table['lut'])
+
+    assert table['reference'] == pytest.approx(3.2) and table['nPoints'] == 17
+    assert lut[0] == 1. and lut[255] == 0.
+    # measured points are exact, settings in between are linearly interpolated.
+    assert lut[32] == pytest.approx(transmission(32), abs=1e-6)
+    assert lut[40] == pytest.approx((transmission(32) + transmission(48)) / 2, abs=1e-6)
+
+
+def test_persisted(tmp_path, calibration):
+    reloaded = AttenuatorCalibration(str(tmp_path / 'attenuatorCalibration.json'))
+
+    assert reloaded.get('halogen') == calibration.get('halogen')
+    assert reloaded.get('neon') is None
+
+
+def test_setting_for_monotonic(calibration):
+    targets = np.linspace(0, 3.2, 50)
+    settings = [calibration.settingFor('halogen', target)[0] for target in targets]
+
+    assert settings[0] == 255 and settings[-1] == 0
+    assert np.all(np.diff(settings) <= 0)
+
+
+def test_setting_for_expected_flux(calibration):
+    setting, expected = calibration.settingFor('halogen', 1.6)
+
+    assert expected == pytest.approx(1.6, rel=0.02)
+    assert expected == pytest.approx(3.2 * transmission(setting), rel=0.01)
+
+
+def test_setting_for_scaled_to_current_flux(calibration):
+    # lamp 10% dimmer than during the calibration.
+    currentFlux = 0.9 * 3.2 * transmission(32)
+    setting, expected = calibration.settingFor('halogen', 1.6, currentSetting=32, currentFlux=currentFlux)
+
+    assert expected == pytest.approx(1.6, rel=0.02)
+    assert setting < calibration.settingFor('halogen', 1.6)[0]
+
+
+def test_dark_current_setting_uses_reference(calibration):
+    reference = calibration.settingFor('halogen', 1.6)
+
+    assert calibration.settingFor('halogen', 1.6, currentSetting=255, currentFlux=0.001) == reference
+
+
+def test_uncalibrated(calibration):
+    with pytest.raises(KeyError):
+        calibration.settingFor('neon', 1.)
+
+    with pytest.raises(ValueError):
+        calibration.update('neon', [0, 255], [0., 0.])
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+from dcbActor.utils.fluxStability import StabilityDetector
+from dcbActor.utils.warmupProfiles import WarmupProfiles
+
+
+def trueDrift(tau, t):
+    """Remaining relative flux change of the replayed warmup at time t."""
+    return 0.5 * np.exp(-t / tau) / (1 - 0.5 * np.exp(-t / tau))
+
+
+def warmup(tau, noise, seed, timeout=300, profile=None, **kwargs):
+    """Replay a 3.2 * (1 - 0.5 * exp(-t / tau)) warmup with relative gaussian noise, sampled as stabFlux does."""
+    rng = np.random.default_rng(seed)
+    detector = StabilityDetector(**kwargs)
+    if profile is not None:
+        detector.tune(profile)
+    t = 0.
+
+    while t < timeout:
+        detector.new(t, 3.2 * (1 - 0.5 * np.exp(-t / tau)) * (1 + rng.normal(0, noise)))
+        if detector.isStable:
+            break
+        t += detector.nextPeriod
+
+    return t, detector
+
+
+@pytest.mark.parametrize('tau', [5, 20, 60])
+@pytest.mark.parametrize('noise', [0.0003, 0.001, 0.003])
+@pytest.mark.parametrize('seed', range(3))
+def test_never_later_than_legacy(tau, noise, seed):
+    elapsed, detector = warmup(tau, noise, seed)
+
+    assert detector.isStable
+    if detector.isLegacyStable:
+        assert elapsed <= detector.legacyDecision()
+    assert detector.timeSaved(elapsed) >= 0
+
+
+@pytest.mark.parametrize('noise', [0.0003, 0.001])
+@pytest.mark.parametrize('seed', range(3))
+def test_fast_warmup_predicted(noise, seed):
+    elapsed, detector = warmup(5, noise, seed)
+
+    assert detector.isPredicted and not detector.isLegacyStable
+    assert trueDrift(5, elapsed) < detector.tolerance
+
+
+def test_dark_never_stable():
+    rng = np.random.default_rng(0)
+    detector = StabilityDetector()
+    for t in range(100):
+        detector.new(t, abs(rng.normal(0, 0.001)))
+
+    assert not detector.isStable
+
+
+@pytest.mark.parametrize('tau', [5, 10, 20])
+def test_fit_decay_time(tau):
+    elapsed, detector = warmup(tau, 0.001, 0, timeout=3 * tau + 100)
+
+    assert detector.fitDecayTime() == pytest.approx(tau, rel=0.1)
+
+
+@pytest.mark.parametrize('noise', [0.0003, 0.001, 0.003])
+@pytest.mark.parametrize('seed', range(3))
+def test_stored_profile_shortens_warmup(tmp_path, noise, seed):
+    elapsed, detector = warmup(10, noise, seed)
+    path = str(tmp_path / 'warmupProfiles.json')
+    WarmupProfiles(path).update('halogen', timeToStable=elapsed, plateau=detector.level, noise=detector.noise,
+                                tau=detector.fitDecayTime())
+    profile = WarmupProfiles(path).get('halogen')
+
+    untuned, _ = warmup(10, noise, seed + 100)
+    tuned, detector = warmup(10, noise, seed + 100, profile=profile)
+
+    assert detector.isPredicted
+    assert tuned < untuned - 5
+    assert trueDrift(10, tuned) < detector.tolerance
+
+
+@pytest.mark.parametrize('tau, priorTau', [(20, 10), (10, 20), (10, 5), (60, 20), (5, 10)])
+@pytest.mark.parametrize('seed', range(3))
+def test_wrong_profile_never_decides_early(tau, priorTau, seed):
+    elapsed, detector = warmup(tau, 0.001, seed, profile=dict(tau=priorTau))
+
+    assert not detector.isPredicted or trueDrift(tau, elapsed) < detector.tolerance
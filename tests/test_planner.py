@@ -0,0 +1,83 @@
+import threading
+
+import pytest
+from dcbActor.utils.planner import Planner
+
+
+def test_unknown_requirement_raises():
+    planner = Planner()
+    planner.add('a', lambda: None)
+
+    with pytest.raises(KeyError):
+        planner.add('b', lambda: None, requires=['c'])
+
+
+def test_cycle_raises():
+    # a step can only require steps added before it, so closing a cycle always raises.
+    planner = Planner()
+    planner.add('a', lambda: None)
+    planner.add('b', lambda: None, requires=['a'])
+
+    with pytest.raises(KeyError):
+        planner.add('a', lambda: None, requires=['b'])
+
+    with pytest.raises(KeyError):
+        planner.add('c', lambda: None, requires=['c'])
+
+
+def test_independent_steps_run_concurrently():
+    barrier = threading.Barrier(2, timeout=5)
+    planner = Planner()
+    planner.add('power', barrier.wait)
+    planner.add('mono', barrier.wait)
+
+    # would raise BrokenBarrierError if the steps were run one after the other.
+    planner.run()
+
+
+def test_requirements_and_resources_order():
+    order = []
+    lock = threading.Lock()
+
+    def step(name):
+        with lock:
+            order.append(name)
+
+    planner = Planner()
+    planner.add('power', step, 'power')
+    planner.add('warmup', step, 'warmup', requires=['power'])
+    planner.add('attenuator', step, 'attenuator', resource='labsphere')
+    planner.add('halogen', step, 'halogen', resource='labsphere')
+    planner.run()
+
+    assert order.index('power') < order.index('warmup')
+    assert order.index('attenuator') < order.index('halogen')
+
+
+def test_failure_skips_dependents():
+    ran = []
+
+    def fail():
+        raise RuntimeError('power failed')
+
+    planner = Planner()
+    planner.add('power', fail)
+    planner.add('warmup', ran.append, 'warmup', requires=['power'])
+    planner.add('mono', ran.append, 'mono')
+
+    with pytest.raises(RuntimeError, match='power failed'):
+        planner.run()
+
+    assert ran == ['mono']
+    assert planner.steps['warmup'].skipped
+
+
+def test_critical_path():
+    planner = Planner()
+    planner.add('power', lambda: None, estimate=2)
+    planner.add('warmup', lambda: None, requires=['power'], estimate=30)
+    planner.add('mono', lambda: None, estimate=10)
+    planner.add('attenuator', lambda: None, requires=['mono'], estimate=5)
+
+    assert planner.criticalPath() == (['power', 'warmup'], 32)
+    assert Planner().criticalPath() == ([], 0.)
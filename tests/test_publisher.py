@@ -0,0 +1,108 @@
+import configparser
+
+import pytest
+from dcbActor.utils import publisher
+from dcbActor.utils.publisher import Policy, Publisher
+
+
+class Cmd(object):
+    def __init__(self):
+        self.replies = []
+
+    def inform(self, response):
+        self.replies.append(response)
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 1000.
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(publisher.time, 'time', clock)
+    return clock
+
+
+def makePublisher(**policies):
+    config = configparser.ConfigParser()
+    config.read_dict(dict(publish=policies))
+    pub = Publisher()
+    pub.configure(config)
+    return pub
+
+
+def test_policy_from_string():
+    policy = Policy.fromString('1%, 0.5')
+
+    assert policy.relative and policy.deadband == pytest.approx(0.01) and policy.minInterval == 2.
+
+
+@pytest.mark.parametrize('values, published, changed', [((1.005,), (1.,), False),
+                                                        ((1.02,), (1.,), True),
+                                                        ((float('nan'),), (float('nan'),), False),
+                                                        ((float('nan'),), (1.,), True),
+                                                        ((1.,), (float('nan'),), True),
+                                                        ((1., float('nan')), (1., float('nan')), False),
+                                                        ((1., 2.), (1., float('nan')), True)])
+def test_deadband(values, published, changed):
+    assert Policy(deadband=0.01, relative=True).hasChanged(values, published) == changed
+
+
+def test_suppressed_within_deadband(clock):
+    pub = makePublisher(photodiode='0.01,0')
+    cmd = Cmd()
+
+    for value in [1., 1.005, 0.995, 1.02]:
+        pub.inform(cmd, 'photodiode', '%.3f', value)
+        clock.now += 1
+
+    assert cmd.replies == ['photodiode=1.000', 'photodiode=1.020']
+    assert pub.suppressed == dict(photodiode=2)
+
+
+def test_rate_limited(clock):
+    pub = makePublisher(atenVAW='0,1')
+    cmd = Cmd()
+
+    for value in range(5):
+        pub.inform(cmd, 'atenVAW', '%d', value)
+        clock.now += 0.4
+
+    # published at 0 and 1.2s, 0.4 and 0.8s are suppressed, the latest of them is kept until flushed.
+    assert cmd.replies == ['atenVAW=0', 'atenVAW=3']
+
+    pub.flush(cmd)
+
+    assert cmd.replies == ['atenVAW=0', 'atenVAW=3', 'atenVAW=4']
+
+
+def test_nan_rate_limited(clock):
+    pub = makePublisher(photodiode='0.01,1')
+    cmd = Cmd()
+
+    for i in range(10):
+        pub.inform(cmd, 'photodiode', '%.3f', float('nan'))
+        clock.now += 0.1
+
+    assert cmd.replies == ['photodiode=nan']
+
+    pub.inform(cmd, 'photodiode', '%.3f', 1.)
+    clock.now += 1
+    pub.inform(cmd, 'photodiode', '%.3f', 1.)
+
+    assert cmd.replies == ['photodiode=nan', 'photodiode=1.000']
+
+
+def test_without_policy_always_published(clock):
+    pub = makePublisher()
+    cmd = Cmd()
+
+    for i in range(3):
+        pub.inform(cmd, 'photodiode', '%.3f', 1.)
+
+    assert cmd.replies == ['photodiode=1.000'] * 3
@@ -0,0 +1,184 @@
+import time
+
+import pytest
+from dcbActor.utils.scheduler import MonitorScheduler
+
+
+class State(object):
+    def __init__(self, current):
+        self.current = current
+
+
+class Controller(object):
+    """FSMThread stand-in, messages are queued and run on demand as the controller thread would."""
+
+    def __init__(self, monitor=15):
+        self.monitor = monitor
+        self.states = State('ONLINE')
+        self.substates = State('IDLE')
+        self.messages = []
+        self.generated = []
+
+    def putMsg(self, func, *args):
+        self.messages.append((func, args))
+
+    def runMessages(self):
+        while self.messages:
+            func, args = self.messages.pop(0)
+            func(*args)
+
+    def generate(self, cmd):
+        self.generated.append(cmd)
+
+
+class Cmd(object):
+    def __init__(self):
+        self.replies = []
+
+    def inform(self, response):
+        self.replies.append(response)
+
+    warn = inform
+
+
+class Actor(object):
+    def __init__(self, **controllers):
+        self.controllers = controllers
+        self.bcast = Cmd()
+
+
+@pytest.fixture
+def actor():
+    return Actor(mono=Controller(monitor=15), labsphere=Controller(monitor=0))
+
+
+@pytest.fixture
+def scheduler(actor):
+    scheduler = MonitorScheduler(actor, jitter=0)
+    scheduler.adopt()
+    return scheduler
+
+
+def makeDue(scheduler, name):
+    scheduler.stats[name].nextTick = time.time() - 0.1
+
+
+def test_adopt(actor, scheduler):
+    assert actor.controllers['mono'].monitor == 0
+    assert scheduler.period('mono') == 15
+    assert scheduler.period('labsphere') == 0
+    assert scheduler.stats['mono'].nextTick % 15 == pytest.approx(0)
+
+
+def test_aligned_tick(scheduler):
+    assert scheduler.alignedTick(15, now=1000) == 1005
+    assert scheduler.alignedTick(15, now=1005) == 1020
+
+
+def test_tick_generates_status(actor, scheduler):
+    mono = actor.controllers['mono']
+    makeDue(scheduler, 'mono')
+    scheduler.tick()
+
+    assert scheduler.stats['mono'].pending
+    mono.runMessages()
+
+    assert mono.generated == [actor.bcast]
+    assert not scheduler.stats['mono'].pending
+    assert scheduler.stats['mono'].scheduled == 1
+    assert scheduler.stats['mono'].nextTick > time.time()
+
+
+def test_not_due_not_generated(actor, scheduler):
+    scheduler.tick()
+
+    assert not actor.controllers['mono'].messages
+
+
+@pytest.mark.parametrize('state, substate', [('LOADED', 'IDLE'), ('ONLINE', 'MOVING'), ('ONLINE', 'FAILED')])
+def test_skipped_busy(actor, scheduler, state, substate):
+    mono = actor.controllers['mono']
+    mono.states.current, mono.substates.current = state, substate
+    makeDue(scheduler, 'mono')
+    scheduler.tick()
+
+    assert not mono.messages
+    assert scheduler.stats['mono'].skippedBusy == 1
+
+
+def test_skipped_pending(actor, scheduler):
+    mono = actor.controllers['mono']
+    makeDue(scheduler, 'mono')
+    scheduler.tick()
+    makeDue(scheduler, 'mono')
+    scheduler.tick()
+
+    assert len(mono.messages) == 1
+    assert scheduler.stats['mono'].skippedBusy == 1
+
+
+def test_skipped_fresh(actor, scheduler):
+    mono = actor.controllers['mono']
+    mono.lastData = time.time()
+    makeDue(scheduler, 'mono')
+    scheduler.tick()
+
+    assert not mono.messages
+    assert scheduler.stats['mono'].skippedFresh == 1
+
+
+def test_own_poll_is_not_fresh(actor, scheduler):
+    mono = actor.controllers['mono']
+    makeDue(scheduler, 'mono')
+    scheduler.tick()
+    mono.lastData = time.time()
+    mono.runMessages()
+
+    makeDue(scheduler, 'mono')
+    scheduler.tick()
+
+    assert len(mono.messages) == 1
+    assert scheduler.stats['mono'].skippedFresh == 0
+
+
+def test_late(actor, scheduler):
+    mono = actor.controllers['mono']
+    scheduler.stats['mono'].nextTick = time.time() - 10
+    scheduler.tick()
+    mono.runMessages()
+
+    assert scheduler.stats['mono'].late == 1
+
+
+def test_reconnected_controller_resets_stats(actor, scheduler):
+    makeDue(scheduler, 'mono')
+    scheduler.tick()
+
+    # the status queued to the previous controller object never completes.
+    actor.controllers['mono'] = Controller(monitor=30)
+    scheduler.adopt()
+
+    assert scheduler.period('mono') == 30
+    assert not scheduler.stats['mono'].pending
+    assert scheduler.stats['mono'].scheduled == 0
+
+
+def test_gen_keys(actor, scheduler):
+    cmd = Cmd()
+    makeDue(scheduler, 'mono')
+    scheduler.tick()
+    scheduler.genKeys(cmd)
+
+    assert cmd.replies == ['monitorStats=mono,15,1,0,0,0']
+
+
+def test_failed_status_warns(actor, scheduler):
+    mono = actor.controllers['mono']
+    mono.generate = lambda cmd: 1 / 0
+    actor.strTraceback = lambda e: repr(e)
+    makeDue(scheduler, 'mono')
+    scheduler.tick()
+    mono.runMessages()
+
+    assert actor.bcast.replies == ["text=ZeroDivisionError('division by zero')"]
+    assert not scheduler.stats['mono'].pending
@@ -0,0 +1,99 @@
+import pytest
+from dcbActor.utils import sequence
+from dcbActor.utils.attenuatorCalibration import AttenuatorCalibration
+
+
+class Labsphere(object):
+    def __init__(self, calibration):
+        self.calibration = calibration
+
+
+class Actor(object):
+    """Connected controllers and lamps state, as DcbActor exposes them."""
+
+    def __init__(self, controllers, arcs):
+        self.controllers = controllers
+        self._arcs = arcs
+
+    @property
+    def arcs(self):
+        if self._arcs is None:
+            raise KeyError('halogen')
+        return self._arcs
+
+    @staticmethod
+    def combinationOf(arcs):
+        lamps = sorted([lamp for lamp, state in arcs.items() if state == 'on'])
+        return '+'.join(lamps) if lamps else 'none'
+
+
+@pytest.fixture
+def actor(tmp_path):
+    calibration = AttenuatorCalibration(str(tmp_path / 'attenuatorCalibration.json'))
+    calibration.update('neon', [0, 255], [1., 0.])
+    arcs = dict(neon='off', hgar='off', halogen='off')
+    return Actor(dict(labsphere=Labsphere(calibration), aten=object(), mono=object()), arcs)
+
+
+def test_parse():
+    steps = sequence.parse('arc on=neon,hgar attenuator=100  # warmup\n'
+                           'mono set wave=550; mono shutter open\n'
+                           '\n'
+                           'wait 5\n'
+                           'labsphere fluxTarget=0.5')
+
+    assert [step.func for step in steps] == [sequence.arc, sequence.setWave, sequence.shutter, None, sequence.flux]
+    assert steps[0].kwargs == dict(on=['neon', 'hgar'], off=[], attenuator=100, force=False)
+    assert steps[0].controllers == ['labsphere', 'aten']
+    assert steps[1].kwargs == dict(wavelength=550.)
+    assert steps[3].kwargs == dict(seconds=5.)
+    assert steps[4].kwargs == dict(target=0.5)
+
+
+@pytest.mark.parametrize('text', ['wait', 'wait -1', 'wait soon', 'arc', 'arc on', 'arc on=neon color=red',
+                                  'arc attenuator=high', 'labsphere attenuator', 'labsphere fluxTarget=bright',
+                                  'labsphere halogen dim', 'mono set wave=blue', 'mono set color=red',
+                                  'mono shutter ajar', 'monoqth toggle', 'dance'])
+def test_invalid_step_rejected(text):
+    with pytest.raises(ValueError, match='line 2 : '):
+        sequence.parse('wait 1\n%s' % text)
+
+
+@pytest.mark.parametrize('text', ['', '# nothing\n ; \n'])
+def test_empty_sequence_rejected(text):
+    with pytest.raises(ValueError, match='empty sequence'):
+        sequence.parse(text)
+
+
+def test_validate(actor):
+    sequence.validate(actor, sequence.parse('arc on=neon; labsphere fluxTarget=0.5; mono set wave=550'))
+
+
+def test_validate_controller_not_connected(actor):
+    with pytest.raises(RuntimeError, match='monoqth controller is not connected'):
+        sequence.validate(actor, sequence.parse('monoqth on'))
+
+
+def test_validate_unknown_lamp(actor):
+    with pytest.raises(KeyError, match='krypton'):
+        sequence.validate(actor, sequence.parse('arc on=krypton'))
+
+
+@pytest.mark.parametrize('text', ['arc on=neon attenuator=256', 'labsphere attenuator=-1'])
+def test_validate_attenuator_range(actor, text):
+    with pytest.raises(ValueError, match='0-255'):
+        sequence.validate(actor, sequence.parse(text))
+
+
+def test_validate_flux_follows_lamps(actor):
+    # neon is calibrated, but hgar is also on when the flux step is reached.
+    with pytest.raises(RuntimeError, match='hgar\\+neon attenuator has not been calibrated'):
+        sequence.validate(actor, sequence.parse('arc on=neon; labsphere fluxTarget=0.5; arc on=hgar; '
+                                                'labsphere fluxTarget=0.5'))
+
+
+def test_validate_flux_unknown_lamps(actor):
+    actor._arcs = None
+
+    with pytest.raises(RuntimeError, match='lamps state is unknown'):
+        sequence.validate(actor, sequence.parse('labsphere fluxTarget=0.5'))
@@ -0,0 +1,65 @@
+import time
+
+import numpy as np
+import pytest
+from dcbActor.utils.telemetry import TelemetryReader, TelemetryWriter, dayOf
+
+
+@pytest.fixture
+def writer(tmp_path):
+    writer = TelemetryWriter(str(tmp_path), blockSize=4)
+    yield writer
+    writer.close()
+
+
+def test_round_trip(tmp_path, writer):
+    t0 = time.mktime((2024, 5, 12, 12, 0, 0, 0, 0, -1))
+    for i in range(10):
+        writer.record('labsphere.photodiode', 3.2 + i, timestamp=t0 + i)
+    writer.recordMany([('aten.volts', '230.0'), ('aten.amps', '0.5')], timestamp=t0 + 10)
+
+    reader = TelemetryReader(str(tmp_path))
+    data = reader.load('2024-05-12')
+
+    assert reader.days() == ['2024-05-12']
+    assert len(data) == 12
+    photodiode = reader.load('2024-05-12', source='labsphere.photodiode')
+    np.testing.assert_array_equal(photodiode['value'], 3.2 + np.arange(10))
+    np.testing.assert_array_equal(reader.load('2024-05-12', start=t0 + 2, end=t0 + 5)['time'], t0 + np.arange(2, 5))
+    assert reader.load('2024-05-12', source='aten.amps')['value'].tolist() == [0.5]
+
+
+def test_committed_records_only(tmp_path, writer):
+    t0 = time.mktime((2024, 5, 12, 12, 0, 0, 0, 0, -1))
+    writer.record('monoqth.watts', 40., timestamp=t0)
+
+    # the file is preallocated by blocks, only the committed record is exposed.
+    assert len(TelemetryReader(str(tmp_path)).memmap('2024-05-12')) == 1
+
+    writer.close()
+    writer.record('monoqth.watts', 41., timestamp=t0 + 1)
+
+    assert TelemetryReader(str(tmp_path)).load('2024-05-12')['value'].tolist() == [40., 41.]
+
+
+def test_daily_rotation(tmp_path, writer):
+    t0 = time.mktime((2024, 5, 12, 23, 59, 58, 0, 0, -1))
+    for i in range(4):
+        writer.record('labsphere.photodiode', i, timestamp=t0 + i)
+
+    reader = TelemetryReader(str(tmp_path))
+
+    assert reader.days() == ['2024-05-12', '2024-05-13']
+    assert dayOf(t0 + 2) == '2024-05-13'
+    assert reader.load('2024-05-12')['value'].tolist() == [0., 1.]
+    assert reader.load('2024-05-13')['value'].tolist() == [2., 3.]
+
+
+def test_bad_values_skipped(tmp_path, writer):
+    t0 = time.mktime((2024, 5, 12, 12, 0, 0, 0, 0, -1))
+    writer.recordMany([('aten.volts', '230.0'), ('aten.amps', 'bad'), ('unknown', 1.), ('aten.watts', '23.0')],
+                      timestamp=t0)
+
+    data = TelemetryReader(str(tmp_path)).load('2024-05-12')
+
+    assert data['value'].tolist() == [230., 23.]
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+from dcbActor.utils.warmupProfiles import WarmupProfiles
+
+
+def test_profiles_persisted(tmp_path):
+    path = str(tmp_path / 'warmupProfiles.json')
+    WarmupProfiles(path, alpha=0.5).update('halogen', timeToStable=40., plateau=3.2, noise=0.001, tau=10.)
+    WarmupProfiles(path, alpha=0.5).update('halogen', timeToStable=60., plateau=3.0, noise=0.003, tau=20.)
+
+    profile = WarmupProfiles(path).get('halogen')
+
+    assert profile['nWarmups'] == 2
+    assert profile['timeToStable'] == pytest.approx(50.)
+    assert profile['plateau'] == pytest.approx(3.1)
+    assert profile['tau'] == pytest.approx(15.)
+    assert WarmupProfiles(path).get('neon') is None
+
+
+def test_timed_out_warmup_only_teaches_decay_time(tmp_path):
+    profiles = WarmupProfiles(str(tmp_path / 'warmupProfiles.json'))
+    profiles.update('halogen', tau=30.)
+
+    assert profiles.get('halogen') == dict(tau=30., nWarmups=1, updated=profiles.get('halogen')['updated'])
+
+    profiles.update('halogen', timeToStable=90., plateau=3.2, noise=0.001, tau=np.nan)
+    profile = profiles.get('halogen')
+
+    assert profile['tau'] == 30. and profile['timeToStable'] == 90. and profile['nWarmups'] == 2